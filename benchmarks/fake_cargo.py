@@ -0,0 +1,228 @@
+import datetime
+import re
+import threading
+from time import sleep
+
+# Response field names are the query field names with underscores as spaces
+_IN_CLAUSE = re.compile(r"(?:\w+\.)?(\w+) IN \(((?:'(?:[^']|'')*'(?:, )?)*)\)")
+_EQUALS = re.compile(r"(?:\w+\.)?(\w+)\s*=\s*'?([\w ]+?)'?(?:\s|$|\))")
+_QUOTED = re.compile(r"'((?:[^']|'')*)'")
+_COMPARISON = re.compile(r"(?:\w+\.)?(\w+)\s*(>=|<)\s*'((?:[^']|'')*)'")
+
+
+def generate_dataset(
+    leagues: int = 20,
+    tourneys_per_league: int = 4,
+    matches_per_tourney: int = 40,
+    teams: int = 400,
+    players: int = 2000,
+    games_per_match: int = 1,
+) -> dict:
+    """Rows per cargo table, already in the shape the loaders' joins return."""
+    now = datetime.datetime.now()
+    team_rows = [
+        {
+            "Name": f"Team {i}",
+            "Short": f"T{i}",
+            "Location": "Somewhere",
+            "Region": f"Region {i % 8}",
+            "IsDisbanded": "1" if i % 10 == 0 else "0",
+        }
+        for i in range(teams)
+    ]
+    league_rows = [
+        {
+            "League": f"League {i}",
+            "League Short": f"L{i}",
+            "Region": f"Region {i % 8}",
+            "Level": "Primary",
+            "IsOfficial": "Yes",
+        }
+        for i in range(leagues)
+    ]
+    tourney_rows = []
+    match_rows = []
+    game_rows = []
+    for league in league_rows:
+        for t in range(tourneys_per_league):
+            name = f"{league['League']} {now.year} Split {t}"
+            tourney_rows.append(
+                {
+                    "Name": name,
+                    "OverviewPage": f"{league['League']}/{now.year} Season/Split {t}",
+                    "DateStart": f"{now.year}-01-0{t % 9 + 1}",
+                    "Date": f"{now.year}-12-01",
+                    "IsQualifier": "0",
+                    "IsPlayoffs": "1" if t == tourneys_per_league - 1 else "0",
+                    "IsOfficial": "1",
+                    "Year": str(now.year),
+                    "League Short": league["League Short"],
+                    "League": league["League"],
+                }
+            )
+            for m in range(matches_per_tourney):
+                start = now + datetime.timedelta(hours=m * 6 - matches_per_tourney * 3)
+                match_rows.append(
+                    {
+                        "MatchId": f"{name}_Week {m // 10}_{m}",
+                        "OverviewPage": tourney_rows[-1]["OverviewPage"],
+                        "Name": name,
+                        "League": league["League"],
+                        "Team1": team_rows[m % teams]["Name"],
+                        "Team2": team_rows[(m + 1) % teams]["Name"],
+                        "Patch": "14.1",
+                        "DateTime UTC": start.strftime("%Y-%m-%d %H:%M:%S"),
+                        "Winner": str(m % 3) if m % 3 else None,
+                        "Team1Score": ["", "2", "1"][m % 3],
+                        "Team2Score": ["", "1", "2"][m % 3],
+                        "BestOf": "3",
+                        "VodGameStart": None,
+                        "VodHighlights": None,
+                    }
+                )
+                for g in range(games_per_match):
+                    game_rows.extend(
+                        _game_rows(match_rows[-1], tourney_rows[-1], g + 1)
+                    )
+    player_rows = [
+        {
+            "ID": f"Player{i}",
+            "Country": "Nowhere",
+            "Age": str(18 + i % 10) if i % 4 else "",
+            "Team": team_rows[i % teams]["Name"],
+            "Residency": f"Region {i % 8}",
+            "Role": ["Top", "Jungle", "Mid", "Bot", "Support"][i % 5],
+            "IsSubstitute": "0",
+        }
+        for i in range(players)
+    ]
+    return {
+        "Leagues": league_rows,
+        "Tournaments": tourney_rows,
+        "MatchSchedule": match_rows,
+        "Teams": team_rows,
+        "TeamRedirects": [],
+        "Players": player_rows,
+        "ScoreboardGames": game_rows,
+    }
+
+
+def _game_rows(match: dict, tourney: dict, n: int) -> list:
+    """One joined ScoreboardGames/ScoreboardPlayers row per player of the game."""
+    game = {
+        "GameId": f"{match['MatchId']}_{n}",
+        "MatchId": match["MatchId"],
+        "OverviewPage": tourney["OverviewPage"],
+        "Tournament": tourney["Name"],
+        "League": tourney["League"],
+        "Team1": match["Team1"],
+        "Team2": match["Team2"],
+        "WinTeam": match["Team1"] if n % 2 else match["Team2"],
+        "DateTime UTC": match["DateTime UTC"],
+        "Patch": match["Patch"],
+        "Gamelength": "31:07",
+        "Team1Bans": "Ahri,Azir,Jinx,Thresh,Vi",
+        "Team2Bans": "Orianna,Kaisa,Nautilus,Sejuani,Renekton",
+    }
+    stats = [
+        "Gold",
+        "Kills",
+        "Towers",
+        "Inhibitors",
+        "Dragons",
+        "Barons",
+        "RiftHeralds",
+    ]
+    for stat in stats:
+        game[f"Team1{stat}"] = str(n * 3)
+        game[f"Team2{stat}"] = str(n * 2)
+    rows = []
+    for side, team in [("1", match["Team1"]), ("2", match["Team2"])]:
+        for role in ["Top", "Jungle", "Mid", "Bot", "Support"]:
+            rows.append(
+                {
+                    **game,
+                    "Link": f"{team} {role}",
+                    "Team": team,
+                    "Champion": "Ahri",
+                    "IngameRole": role,
+                    "Side": side,
+                    "Kills": "3",
+                    "Deaths": "2",
+                    "Assists": "7",
+                    "Gold": "12000",
+                    "CS": "250",
+                    "DamageToChampions": "18000",
+                    "VisionScore": "40",
+                    "SummonerSpells": "Flash,Teleport",
+                    "Items": "Doran's Blade,Infinity Edge,Berserker's Greaves",
+                    "Trinket": "Stealth Ward",
+                }
+            )
+    return rows
+
+
+def _parse_where(where: str) -> list:
+    """Understands the IN lists, simple equalities and range bounds the loaders send,
+    ignores the rest.
+
+    Returns (column, predicate on the lowercase value) pairs.
+    """
+    filters = []
+    for field, values in _IN_CLAUSE.findall(where):
+        allowed = {
+            value.replace("''", "'").lower() for value in _QUOTED.findall(values)
+        }
+        filters.append((field.replace("_", " "), allowed.__contains__))
+    where = _IN_CLAUSE.sub("", where)
+    for field, op, bound in _COMPARISON.findall(where):
+        # Cargo dates are "YYYY-MM-DD HH:MM:SS" so they compare as strings
+        bound = bound.replace("''", "'").lower()
+        filters.append(
+            (field.replace("_", " "), bound.__le__ if op == ">=" else bound.__gt__)
+        )
+    for field, value in _EQUALS.findall(_COMPARISON.sub("", where)):
+        filters.append((field.replace("_", " "), {value.lower()}.__contains__))
+    return filters
+
+
+def _matches(row: dict, filters: list) -> bool:
+    return all(
+        column not in row
+        or (row[column] is not None and allowed(str(row[column]).lower()))
+        for column, allowed in filters
+    )
+
+
+class FakeCargoClient:
+    """Serves generated rows through the cargo_client.query interface with a fixed latency."""
+
+    def __init__(self, dataset: dict, latency: float = 0.0):
+        self.dataset = dataset
+        self.latency = latency
+        self.calls = 0
+        self.rows = 0
+        self._lock = threading.Lock()
+
+    def query(self, tables, fields=None, where=None, limit=500, offset=0, **kwargs):
+        if self.latency:
+            sleep(self.latency)
+        table = tables.split(",")[0].split("=")[0].strip()
+        rows = self.dataset.get(table, [])
+        if where:
+            filters = _parse_where(where)
+            rows = [row for row in rows if _matches(row, filters)]
+        if fields and fields.startswith("COUNT(*)="):
+            rows = [{fields.split("=", 1)[1]: str(len(rows))}]
+        page = [dict(row) for row in rows[offset : offset + limit]]
+        with self._lock:
+            self.calls += 1
+            self.rows += len(page)
+        return page
+
+
+class FakeSite:
+    """Stands in for the EsportsClient, only cargo_client is used by the loaders."""
+
+    def __init__(self, cargo_client: FakeCargoClient):
+        self.cargo_client = cargo_client
@@ -0,0 +1,217 @@
+import copy
+import threading
+from decimal import Decimal
+from time import sleep
+
+# Key schemas of the tables the loaders write
+TABLE_KEYS = {
+    "Leagues": ["leagueId"],
+    "Tournaments": ["leagueId", "tournamentId"],
+    "Matches": ["tournamentId", "matchId"],
+    "Players": ["teamId", "id"],
+    "Teams": ["teamId"],
+    "Games": ["matchId", "gameId"],
+    "Standings": ["tournamentId"],
+}
+
+
+def _to_dynamo(value):
+    # DynamoDB hands every number back as a Decimal
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: _to_dynamo(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_to_dynamo(v) for v in value]
+    return value
+
+
+class Counters:
+    def __init__(self):
+        self.read_calls = 0
+        self.items_read = 0
+        self.write_calls = 0
+        self.items_written = 0
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, count in counts.items():
+                setattr(self, name, getattr(self, name) + count)
+
+
+class FakeBatchWriter:
+    def __init__(self, table):
+        self.table = table
+        self.buffer = []
+
+    def put_item(self, Item):
+        self.buffer.append(Item)
+        if len(self.buffer) >= 25:
+            self._flush()
+
+    def delete_item(self, Key):
+        self.buffer.append(("delete", Key))
+        if len(self.buffer) >= 25:
+            self._flush()
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        self.table._write_batch(self.buffer)
+        self.buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._flush()
+
+
+class FakeTable:
+    """In-memory stand-in for a boto3 Table with the calls the loaders use."""
+
+    def __init__(self, resource, name):
+        self.resource = resource
+        self.name = name
+        self.key_names = TABLE_KEYS[name]
+        self.key_schema = [
+            {"AttributeName": key, "KeyType": "HASH" if i == 0 else "RANGE"}
+            for i, key in enumerate(self.key_names)
+        ]
+        self.items = {}
+        self._lock = threading.Lock()
+
+    def _key(self, item):
+        return tuple(item[name] for name in self.key_names)
+
+    def _write_batch(self, batch):
+        self.resource._wait()
+        with self._lock:
+            for entry in batch:
+                if isinstance(entry, tuple):
+                    self.items.pop(self._key(entry[1]), None)
+                else:
+                    self.items[self._key(entry)] = _to_dynamo(copy.deepcopy(entry))
+        self.resource.counters.add(write_calls=1, items_written=len(batch))
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return FakeBatchWriter(self)
+
+    def put_item(self, Item, **kwargs):
+        self._write_batch([Item])
+        return {}
+
+    def get_item(self, Key, **kwargs):
+        self.resource._wait()
+        item = self.items.get(self._key(Key))
+        self.resource.counters.add(read_calls=1, items_read=1 if item else 0)
+        return {"Item": copy.deepcopy(item)} if item else {}
+
+    def scan(self, ExclusiveStartKey=None, Limit=1000, **kwargs):
+        self.resource._wait()
+        with self._lock:
+            keys = sorted(self.items, key=str)
+        start = 0
+        if ExclusiveStartKey:
+            start = keys.index(self._key(ExclusiveStartKey)) + 1
+        page = [copy.deepcopy(self.items[key]) for key in keys[start : start + Limit]]
+        self.resource.counters.add(read_calls=1, items_read=len(page))
+        response = {"Items": page, "Count": len(page)}
+        if start + Limit < len(keys):
+            response["LastEvaluatedKey"] = {
+                name: page[-1][name] for name in self.key_names
+            }
+        return response
+
+    def query(
+        self,
+        KeyConditionExpression,
+        ExpressionAttributeValues,
+        ExpressionAttributeNames=None,
+        ExclusiveStartKey=None,
+        Limit=1000,
+        **kwargs,
+    ):
+        """Only understands the `#name = :value` partition key conditions the loaders use."""
+        name, value = KeyConditionExpression.split(" = ")
+        name = (ExpressionAttributeNames or {}).get(name, name)
+        value = ExpressionAttributeValues[value]
+        self.resource._wait()
+        with self._lock:
+            keys = sorted(
+                (key for key, item in self.items.items() if item.get(name) == value),
+                key=str,
+            )
+        start = 0
+        if ExclusiveStartKey:
+            start = keys.index(self._key(ExclusiveStartKey)) + 1
+        page = [copy.deepcopy(self.items[key]) for key in keys[start : start + Limit]]
+        self.resource.counters.add(read_calls=1, items_read=len(page))
+        response = {"Items": page, "Count": len(page)}
+        if start + Limit < len(keys):
+            response["LastEvaluatedKey"] = {
+                name: page[-1][name] for name in self.key_names
+            }
+        return response
+
+
+class FakeDynamoResource:
+    """In-memory stand-in for boto3.resource("dynamodb") with a fixed per call latency."""
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.counters = Counters()
+        self.tables = {}
+
+    def _wait(self):
+        if self.latency:
+            sleep(self.latency)
+
+    def Table(self, name):
+        if name not in self.tables:
+            self.tables[name] = FakeTable(self, name)
+        return self.tables[name]
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        self._wait()
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            found = [
+                copy.deepcopy(table.items[table._key(key)])
+                for key in request["Keys"]
+                if table._key(key) in table.items
+            ]
+            responses[name] = found
+            self.counters.add(read_calls=1, items_read=len(found))
+        response = {"Responses": responses, "UnprocessedKeys": {}}
+        if kwargs.get("ReturnConsumedCapacity") == "TOTAL":
+            # One eventually consistent read unit covers two items up to 4KB
+            response["ConsumedCapacity"] = [
+                {"TableName": name, "CapacityUnits": len(request["Keys"]) / 2}
+                for name, request in RequestItems.items()
+            ]
+        return response
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        for name, requests in RequestItems.items():
+            self.Table(name)._write_batch(
+                [
+                    (
+                        request["PutRequest"]["Item"]
+                        if "PutRequest" in request
+                        else ("delete", request["DeleteRequest"]["Key"])
+                    )
+                    for request in requests
+                ]
+            )
+        response = {"UnprocessedItems": {}}
+        if kwargs.get("ReturnConsumedCapacity") == "TOTAL":
+            response["ConsumedCapacity"] = [
+                {"TableName": name, "CapacityUnits": float(len(requests))}
+                for name, requests in RequestItems.items()
+            ]
+        return response
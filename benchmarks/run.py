@@ -0,0 +1,470 @@
+"""Offline loader benchmarks against a fake Cargo server and an in-memory DynamoDB.
+
+PYTHONPATH=src python benchmarks/run.py                  # run and print results
+PYTHONPATH=src python benchmarks/run.py --compare        # fail when call counts grow vs baseline.json
+PYTHONPATH=src python benchmarks/run.py --save-baseline  # store the results as the new baseline
+"""
+
+import copy
+import json
+import logging
+import os
+import sys
+import tempfile
+import tracemalloc
+from argparse import ArgumentParser
+from pathlib import Path
+from time import perf_counter
+
+BENCHMARK_DIR = Path(__file__).resolve().parent
+BASELINE = BENCHMARK_DIR / "baseline.json"
+
+sys.path.insert(0, str(BENCHMARK_DIR))
+sys.path.insert(0, str(BENCHMARK_DIR.parent / "src"))
+
+# Counters that must never grow compared to the baseline
+COUNTED = ["cargo_calls", "ddb_read_calls", "ddb_write_calls", "items_written"]
+
+SCALES = {
+    "small": dict(
+        leagues=10,
+        tourneys_per_league=3,
+        matches_per_tourney=30,
+        teams=200,
+        players=1000,
+    ),
+    "medium": dict(
+        leagues=40,
+        tourneys_per_league=4,
+        matches_per_tourney=60,
+        teams=1000,
+        players=5000,
+    ),
+    "large": dict(
+        leagues=150,
+        tourneys_per_league=6,
+        matches_per_tourney=80,
+        teams=4000,
+        players=25000,
+    ),
+}
+
+
+def load_matches_and_standings(dl, data):
+    # Standings follow the matches this run wrote, nothing is left over from earlier runs
+    dl.tournaments_with_match_changes.clear()
+    dl.load_matches([dict(tourney) for tourney in data["Tournaments"]])
+    dl.load_standings(dl.tournaments_with_match_changes)
+
+
+SCENARIOS = {
+    "leagues": lambda dl, data: dl.load_leagues_and_return_leagues(),
+    "tourneys": lambda dl, data: dl.load_tourneys_and_return_overview_pages(
+        [league["League"] for league in data["Leagues"]]
+    ),
+    "matches": lambda dl, data: dl.load_matches(
+        [dict(tourney) for tourney in data["Tournaments"]]
+    ),
+    "players": lambda dl, data: dl.load_players(),
+    "teams": lambda dl, data: dl.load_teams(),
+    "games": lambda dl, data: dl.load_games(
+        [dict(tourney) for tourney in data["Tournaments"]]
+    ),
+    "standings": load_matches_and_standings,
+}
+
+
+def load_partitioned_tables(dl, data):
+    # Like load_all, every loader gets the leagues and tournaments its shard kept
+    tourneys = dl.load_tourneys_and_return_overview_pages(
+        dl.load_leagues_and_return_leagues()
+    )
+    dl.tournaments_with_match_changes.clear()
+    dl.load_matches(tourneys)
+    dl.load_games(tourneys)
+    dl.load_standings(dl.tournaments_with_match_changes)
+
+
+def get_arg_parser() -> ArgumentParser:
+    parser = ArgumentParser(description="Offline loader benchmarks")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS)
+    parser.add_argument("--cargo-latency-ms", type=float, default=20)
+    parser.add_argument("--ddb-latency-ms", type=float, default=2)
+    parser.add_argument("--cargo-rps", type=float, default=1000)
+    parser.add_argument(
+        "--prefetch-workers",
+        type=int,
+        default=1,
+        help="Cargo pages of one query fetched at a time, see LEAGUEPEDIA_PREFETCH_WORKERS",
+    )
+    parser.add_argument(
+        "--dynamodb-endpoint",
+        help="Use DynamoDB Local at this endpoint instead of the in-memory stand-in",
+    )
+    parser.add_argument(
+        "--check-shards",
+        type=int,
+        help="Check that N shards together write what one unsharded run writes, "
+        "3 with --compare",
+    )
+    parser.add_argument(
+        "--check-reconcile",
+        action="store_true",
+        help="Check reconcile's orphan detection, dry run and threshold, on with --compare",
+    )
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.5,
+        help="Relative drop in rows/sec or growth in peak memory that gets reported",
+    )
+    return parser
+
+
+def setup(args, state_dir: str):
+    os.environ["LOADER_STATE_DIR"] = state_dir
+    os.environ["LEAGUEPEDIA_CACHE"] = "off"
+    import data_loading
+
+    logging.getLogger().setLevel(logging.WARNING)
+
+    from fake_cargo import FakeCargoClient, FakeSite, generate_dataset
+    from leaguepedia.rate_limiter import RateLimiter
+
+    data = generate_dataset(**SCALES[args.scale])
+    cargo = FakeCargoClient(data, latency=args.cargo_latency_ms / 1000)
+    site = data_loading.leaguepedia
+    site._site = FakeSite(cargo)
+    site.rate_limiter = RateLimiter(args.cargo_rps, burst=int(args.cargo_rps))
+    site.prefetch_workers = args.prefetch_workers
+    return data_loading, data, cargo
+
+
+def make_ddb(args):
+    if args.dynamodb_endpoint:
+        import boto3
+        from fake_dynamodb import TABLE_KEYS
+
+        ddb = boto3.resource(
+            "dynamodb", endpoint_url=args.dynamodb_endpoint, region_name="us-west-2"
+        )
+        existing = {table.name for table in ddb.tables.all()}
+        for name, keys in TABLE_KEYS.items():
+            if name in existing:
+                ddb.Table(name).delete()
+                ddb.Table(name).wait_until_not_exists()
+            ddb.create_table(
+                TableName=name,
+                KeySchema=[
+                    {"AttributeName": key, "KeyType": "HASH" if i == 0 else "RANGE"}
+                    for i, key in enumerate(keys)
+                ],
+                AttributeDefinitions=[
+                    {"AttributeName": key, "AttributeType": "S"} for key in keys
+                ],
+                BillingMode="PAY_PER_REQUEST",
+            ).wait_until_exists()
+        return ddb
+
+    from fake_dynamodb import FakeDynamoResource
+
+    return FakeDynamoResource(latency=args.ddb_latency_ms / 1000)
+
+
+def point_loaders_at(data_loading, ddb, manifest_path: str):
+    from util.manifest import Manifest
+
+    manifest = Manifest(manifest_path)
+    for table_sync in data_loading.all_syncs:
+        table_sync.ddb = ddb
+        table_sync.table = ddb.Table(table_sync.table_name)
+        table_sync.manifest = manifest
+
+
+def measure(fn, cargo, ddb) -> dict:
+    counters = getattr(ddb, "counters", None)
+    before = dict(vars(counters)) if counters else {}
+    calls, rows = cargo.calls, cargo.rows
+    tracemalloc.start()
+    started = perf_counter()
+    fn()
+    elapsed = perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rows = cargo.rows - rows
+    result = {
+        "seconds": round(elapsed, 3),
+        "cargo_calls": cargo.calls - calls,
+        "cargo_rows": rows,
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed else None,
+        "peak_memory_kb": peak // 1024,
+    }
+    if counters:
+        result.update(
+            ddb_read_calls=counters.read_calls - before["read_calls"],
+            items_read=counters.items_read - before["items_read"],
+            ddb_write_calls=counters.write_calls - before["write_calls"],
+            items_written=counters.items_written - before["items_written"],
+        )
+    return result
+
+
+def run(args, shards: int = 0, reconcile: bool = False) -> tuple:
+    """Returns the results per scenario and the problems check_shards found with that many
+    shards and check_reconcile found."""
+    results = {}
+    problems = []
+    with tempfile.TemporaryDirectory() as state_dir:
+        data_loading, data, cargo = setup(args, state_dir)
+        # Build the team code index up front so every scenario measures only its loader
+        data_loading.team_resolver.index
+
+        for name in args.scenario or SCENARIOS:
+            ddb = make_ddb(args)
+            point_loaders_at(data_loading, ddb, f"{state_dir}/{name}-manifest.sqlite3")
+            scenario = SCENARIOS[name]
+            # Cold writes everything into empty tables, warm re-runs with nothing changed
+            results[name] = {
+                "cold": measure(lambda: scenario(data_loading, data), cargo, ddb),
+                "warm": measure(lambda: scenario(data_loading, data), cargo, ddb),
+            }
+        if shards:
+            problems += [
+                f"SHARDING {problem}"
+                for problem in check_shards(args, data_loading, data, state_dir, shards)
+            ]
+        if reconcile:
+            problems += [
+                f"RECONCILE {problem}"
+                for problem in check_reconcile(args, data_loading, data, state_dir)
+            ]
+    return results, problems
+
+
+def check_shards(args, data_loading, data, state_dir: str, count: int) -> list:
+    """Loads the partitioned tables once unsharded and once per shard into its own tables,
+    returns the tables that shards overlap on or whose union differs from unsharded."""
+    from util.shard import Shard
+
+    unsharded = make_ddb(args)
+    point_loaders_at(data_loading, unsharded, f"{state_dir}/unsharded.sqlite3")
+    load_partitioned_tables(data_loading, data)
+    shards = []
+    for index in range(count):
+        shards.append(make_ddb(args))
+        point_loaders_at(data_loading, shards[-1], f"{state_dir}/shard-{index}.sqlite3")
+        data_loading.SHARD = Shard(index, count)
+        try:
+            load_partitioned_tables(data_loading, data)
+        finally:
+            data_loading.SHARD = None
+    problems = []
+    for table, expected in unsharded.tables.items():
+        actual = {}
+        written = 0
+        for ddb in shards:
+            items = ddb.Table(table).items
+            actual.update(items)
+            written += len(items)
+        if written != len(actual):
+            problems.append(
+                f"{count} shards wrote {written - len(actual)} {table} more than once"
+            )
+        elif actual != expected.items:
+            problems.append(
+                f"{count} shards wrote {len(actual)} {table}, unsharded {len(expected.items)}"
+            )
+    return problems
+
+
+def check_reconcile(args, data_loading, data, state_dir: str) -> list:
+    """Deletes a tournament, renames a match and drops a team on the fake wiki after a load
+    and runs reconcile as a dry run, with a threshold they exceed and for real.
+
+    A response cache filled before the changes must not hide them. Returns what went
+    differently than expected.
+    """
+    import reconcile
+    from leaguepedia.cache import ResponseCache
+
+    ddb = make_ddb(args)
+    point_loaders_at(data_loading, ddb, f"{state_dir}/reconcile.sqlite3")
+    load_partitioned_tables(data_loading, data)
+    data_loading.load_teams()
+    original = copy.deepcopy(data)
+    problems = []
+
+    def counts():
+        return {name: len(table.items) for name, table in ddb.tables.items()}
+
+    def expect(label, actual, expected):
+        if actual != expected:
+            problems.append(f"{label}: {actual}, expected {expected}")
+
+    site = data_loading.leaguepedia
+    site.cache = ResponseCache(f"{state_dir}/reconcile-cache.sqlite3")
+    try:
+        orphans = reconcile.reconcile(dry_run=True)
+        expect(
+            "orphans after a load", sum(len(keys) for keys in orphans.keys.values()), 0
+        )
+        data_loading.query_teams()
+
+        gone = data["Tournaments"].pop(5)
+        gone_matches = [m for m in data["MatchSchedule"] if m["Name"] == gone["Name"]]
+        data["MatchSchedule"] = [
+            m for m in data["MatchSchedule"] if m not in gone_matches
+        ]
+        data["ScoreboardGames"] = [
+            g for g in data["ScoreboardGames"] if g["Tournament"] != gone["Name"]
+        ]
+        data["MatchSchedule"][0] = dict(
+            data["MatchSchedule"][0],
+            MatchId=data["MatchSchedule"][0]["MatchId"] + " renamed",
+        )
+        data["Teams"].pop(3)
+        orphaned = {
+            "Tournaments": 1,
+            "Matches": len(gone_matches) + 1,
+            "Games": len(gone_matches) + 1,
+            "Teams": 1,
+            "Standings": 1,
+        }
+        loaded = counts()
+
+        orphans = reconcile.reconcile(dry_run=True)
+        expect(
+            "dry run orphans",
+            {table: len(keys) for table, keys in orphans.keys.items() if keys},
+            orphaned,
+        )
+        expect("items after the dry run", counts(), loaded)
+
+        # Only Teams stays under 1%, Games and Standings follow their tables
+        reconcile.reconcile(max_delete_fraction=0.01)
+        expect(
+            "items after the aborted run",
+            counts(),
+            {**loaded, "Teams": loaded["Teams"] - 1},
+        )
+
+        reconcile.reconcile()
+        expect(
+            "items after reconcile",
+            counts(),
+            {table: count - orphaned.get(table, 0) for table, count in loaded.items()},
+        )
+        orphans = reconcile.reconcile(dry_run=True)
+        expect("orphans left", sum(len(keys) for keys in orphans.keys.values()), 0)
+    finally:
+        site.cache = None
+        data.clear()
+        data.update(original)
+    return problems
+
+
+def compare(results: dict, baseline: dict, tolerance: float):
+    """Returns (regressions, warnings).
+
+    Call and write counts are deterministic and must not grow. Timings and memory depend on
+    the machine, so they are only reported when they move past the tolerance.
+    """
+    regressions = []
+    warnings = []
+    for scenario, runs in results.items():
+        for run_name, current in runs.items():
+            previous = baseline.get(scenario, {}).get(run_name)
+            if previous is None:
+                continue
+            label = f"{scenario}/{run_name}"
+            for counter in COUNTED:
+                if counter in previous and current.get(counter, 0) > previous[counter]:
+                    regressions.append(
+                        f"{label}: {counter} {previous[counter]} -> {current[counter]}"
+                    )
+            if previous.get("rows_per_sec") and current["rows_per_sec"] < previous[
+                "rows_per_sec"
+            ] * (1 - tolerance):
+                warnings.append(
+                    f"{label}: rows/sec {previous['rows_per_sec']} -> {current['rows_per_sec']}"
+                )
+            if current["peak_memory_kb"] > previous["peak_memory_kb"] * (1 + tolerance):
+                warnings.append(
+                    f"{label}: peak memory {previous['peak_memory_kb']}KB -> {current['peak_memory_kb']}KB"
+                )
+    return regressions, warnings
+
+
+def print_results(results: dict):
+    columns = [
+        "seconds",
+        "rows_per_sec",
+        "cargo_calls",
+        "ddb_read_calls",
+        "ddb_write_calls",
+        "items_written",
+        "peak_memory_kb",
+    ]
+    print(f"{'scenario':<16}" + "".join(f"{column:>16}" for column in columns))
+    for scenario, runs in results.items():
+        for run_name, result in runs.items():
+            print(
+                f"{scenario + '/' + run_name:<16}"
+                + "".join(f"{str(result.get(column, '-')):>16}" for column in columns)
+            )
+
+
+def main():
+    args = get_arg_parser().parse_args()
+    # The checks need the in-memory tables to compare them
+    shards = (
+        0 if args.dynamodb_endpoint else args.check_shards or (3 if args.compare else 0)
+    )
+    reconcile = not args.dynamodb_endpoint and (args.check_reconcile or args.compare)
+    results, problems = run(args, shards, reconcile)
+    print_results(results)
+    settings = {
+        "scale": args.scale,
+        "cargo_latency_ms": args.cargo_latency_ms,
+        "ddb_latency_ms": args.ddb_latency_ms,
+    }
+    document = {"settings": settings, "results": results}
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(document, indent=2))
+    if args.save_baseline:
+        BASELINE.write_text(json.dumps(document, indent=2) + "\n")
+        print(f"Saved baseline to {BASELINE}")
+    for problem in problems:
+        print(problem)
+    if problems:
+        sys.exit(1)
+    if shards:
+        print(f"{shards} shards write disjoint items adding up to one unsharded run")
+    if reconcile:
+        print("reconcile deleted exactly the orphans")
+    if args.compare:
+        if not BASELINE.exists():
+            print("No baseline to compare against")
+            return
+        baseline = json.loads(BASELINE.read_text())
+        if baseline["settings"] != settings:
+            print(f"Baseline was recorded with {baseline['settings']}, not comparing")
+            return
+        regressions, warnings = compare(results, baseline["results"], args.tolerance)
+        for warning in warnings:
+            print(f"WARNING {warning}")
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import datetime
+import logging
+import signal
+import threading
+from dataclasses import dataclass
+from time import monotonic
+from typing import Callable, List, Optional
+
+import data_loading
+from data_loading import (
+    load_changed_games,
+    load_leagues_and_return_leagues,
+    load_live_matches,
+    load_matches,
+    load_players,
+    load_standings,
+    load_teams,
+    load_tourneys_and_return_overview_pages,
+    query_teams,
+)
+from util.metrics import metrics
+from util.schedule import MatchCalendar
+from util.team_info import team_resolver
+
+logger = logging.getLogger(__name__)
+
+HOUR = datetime.timedelta(hours=1)
+DAY = datetime.timedelta(days=1)
+# A failed job is tried again this soon, whatever its interval
+RETRY_AFTER = datetime.timedelta(minutes=5)
+
+
+@dataclass
+class Job:
+    name: str
+    fn: Callable[[], object]
+    # Time until the next run, asked after every run
+    interval: Callable[[], datetime.timedelta]
+    next_run: float = 0.0
+
+
+class Daemon:
+    """Keeps loading in one process, every table as often as it actually changes.
+
+    The wiki session, DynamoDB connections, team index and manifest stay warm between
+    runs. Slow changing tables refresh hourly or daily, while live matches are polled
+    every live_interval from shortly before they start until they have a winner.
+    """
+
+    def __init__(
+        self,
+        live_interval: datetime.timedelta = datetime.timedelta(minutes=5),
+        idle_interval: datetime.timedelta = HOUR,
+    ):
+        self.live_interval = live_interval
+        self.idle_interval = idle_interval
+        self.calendar = MatchCalendar()
+        self.leagues: Optional[List[str]] = None
+        self.tourneys: Optional[List] = None
+        self._stop = threading.Event()
+        # In run order, so the first round loads what the later jobs depend on
+        self.jobs = [
+            Job("leagues", self.load_leagues, lambda: DAY),
+            Job("teams", self.load_teams, lambda: DAY),
+            Job("tourneys", self.load_tourneys, lambda: HOUR),
+            Job("players", load_players, lambda: HOUR),
+            Job("matches", self.load_matches, lambda: HOUR),
+            Job("live_matches", self.load_live_matches, self.live_matches_interval),
+        ]
+        shard = data_loading.SHARD
+        if shard is not None and shard.index != 0:
+            # Players and Teams are not partitioned, the first shard loads them
+            self.jobs = [
+                job for job in self.jobs if job.name not in ("players", "teams")
+            ]
+
+    def load_leagues(self):
+        self.leagues = load_leagues_and_return_leagues()
+
+    def load_teams(self):
+        if data_loading.INCREMENTAL:
+            load_teams()
+        else:
+            teams = query_teams()
+            load_teams(teams)
+            team_resolver.rebuild(teams)
+
+    def load_tourneys(self):
+        self.tourneys = load_tourneys_and_return_overview_pages(self.leagues)
+
+    def load_matches(self):
+        load_matches(self.tourneys)
+        self.load_match_changes()
+
+    def load_live_matches(self):
+        load_live_matches(self.calendar)
+        self.load_match_changes()
+
+    def load_match_changes(self):
+        """Games whose scoreboards changed and standings of the tournaments whose matches
+        were just written."""
+        changed = data_loading.tournaments_with_match_changes
+        load_changed_games()
+        load_standings(changed)
+        changed.clear()
+
+    def live_matches_interval(self) -> datetime.timedelta:
+        now = datetime.datetime.now(datetime.UTC).replace(tzinfo=None)
+        wait = self.calendar.until_next(now)
+        if wait is None:
+            return self.idle_interval
+        return min(max(wait, self.live_interval), self.idle_interval)
+
+    def run(self):
+        logger.info(f"Daemon started with jobs {[job.name for job in self.jobs]}")
+        while not self._stop.is_set():
+            for job in self.jobs:
+                if job.next_run <= monotonic() and not self._stop.is_set():
+                    self._run_job(job)
+            metrics.write()
+            wait = min(job.next_run for job in self.jobs) - monotonic()
+            self._stop.wait(max(wait, 0))
+        logger.info("Daemon stopped")
+
+    def _run_job(self, job: Job):
+        try:
+            job.fn()
+            interval = job.interval()
+        except Exception as e:
+            logger.error(f"Job {job.name} failed", exc_info=e)
+            metrics.inc("daemon_job_failures", job=job.name)
+            interval = RETRY_AFTER
+        job.next_run = monotonic() + interval.total_seconds()
+        logger.info(f"Next {job.name} run in {interval}")
+
+    def stop(self, *args):
+        self._stop.set()
+
+
+def run_daemon(live_interval: float, idle_interval: float):
+    daemon = Daemon(
+        live_interval=datetime.timedelta(minutes=live_interval),
+        idle_interval=datetime.timedelta(minutes=idle_interval),
+    )
+    # Finish the job at hand and exit on a normal shutdown of the service
+    signal.signal(signal.SIGTERM, daemon.stop)
+    daemon.run()
@@ -1,121 +1,345 @@
 import datetime
+import itertools
+import json
 import logging
+import os
+import threading
 import warnings
-from time import sleep
-from typing import List
+from collections import Counter
+from typing import Iterable, Iterator, List, Optional
 
-import boto3
-from botocore.config import Config
 from mwclient.errors import MaximumRetriesExceeded, APIError
-from rich.logging import RichHandler
-from rich.progress import track, Progress, TaskID
-
-from leaguepedia.leaguepedia import LeaguepediaSite
+from rich.progress import Progress
+
+from leaguepedia.cargo import (
+    CargoQuery,
+    Eq,
+    In,
+    Range,
+    Recent,
+    ThisYear,
+    chunk_in_values,
+)
+from leaguepedia.leaguepedia import leaguepedia
+from leaguepedia.rate_limiter import RateLimiter, SharedRateLimiter
+from models.game import Game
 from models.league import League
 from models.match import Match
 from models.player import Player
+from models.standings import Standings
 from models.team import Team
 from models.tournament import Tournament
-
-leaguepedia = LeaguepediaSite()
+from util.checkpoint import Checkpoint, Checkpoints
+from util.dag import run_dag
+from util.ddb_sync import SyncResult, TableSync
+from util.events import change_events_from_env
+from util.manifest import Manifest
+from util.metrics import metrics
+from util.pipeline import Stage, batched
+from util.progress import shared_progress
+from util.s3_import import ImportFileSync
+from util.schedule import MatchCalendar
+from util.shard import Shard
+from util.state import state_path
+from util.team_info import team_resolver
+from util.watermarks import Watermarks
 
 warnings.filterwarnings(action="ignore", message=r"datetime.datetime.utcnow")
 
-ddb = boto3.resource(
-    "dynamodb", region_name="us-west-2", config=Config(max_pool_connections=30)
-)
-
-leagues_table = ddb.Table("Leagues")
-tournaments_table = ddb.Table("Tournaments")
-games_table = ddb.Table("Games")
-matches_table = ddb.Table("Matches")
-player_table = ddb.Table("Players")
-team_table = ddb.Table("Teams")
-
-logging.basicConfig(level="INFO", datefmt="[%X]", handlers=[RichHandler()])
-
 logger = logging.getLogger(__name__)
 
 # Remove the recency time filters.
 # This will load all history and will take a long time
 LOAD_HISTORICAL = False
-SLEEP = True
+# Only fetch rows whose wiki page changed since the last successful run.
+# With LOAD_HISTORICAL the watermarks are ignored, so everything is loaded once more
+INCREMENTAL = os.environ.get("LOADER_INCREMENTAL", "0") == "1"
+# Skip rows whose content hash matches the local manifest without reading DynamoDB
+USE_MANIFEST = True
+# Tournaments loaded concurrently by load_matches, all workers share the leaguepedia rate limit
+MATCH_WORKERS = int(os.environ.get("MATCH_WORKERS", 4))
+# Concurrent cargo queries for the other batched loaders
+FETCH_WORKERS = int(os.environ.get("FETCH_WORKERS", 4))
+# Concurrent DynamoDB diff/write workers per loader
+WRITE_WORKERS = int(os.environ.get("WRITE_WORKERS", 4))
+# Cargo pages buffered ahead of a build stage, each holds up to leaguepedia.limit rows
+PAGE_QUEUE_SIZE = 8
+# Hash partition of leagues and tournaments this process loads, set with configure_shard
+SHARD: Optional[Shard] = None
+# Skip the leagues/tournaments a previous, unfinished run of the same loader already synced
+RESUME = os.environ.get("LOADER_RESUME", "0") == "1"
+# Query chunks of leagues/tournaments synced between two checkpoints, so a crash redoes at
+# most this many. Each chunk has one fetch worker, more chunks fetch more at once
+CHECKPOINT_CHUNKS = int(os.environ.get("CHECKPOINT_CHUNKS", 2))
+
+manifest = Manifest() if USE_MANIFEST else None
+watermarks = Watermarks()
+checkpoints = Checkpoints()
+# Written items are emitted as change events for downstream consumers, see LOADER_EVENTS
+events = change_events_from_env(os.environ.get("LOADER_EVENTS"))
+
+# The DynamoDB tables are only set up once a loader writes to them
+leagues_sync = TableSync("Leagues", manifest, events=events)
+tournaments_sync = TableSync("Tournaments", manifest, events=events)
+matches_sync = TableSync("Matches", manifest, events=events)
+player_sync = TableSync("Players", manifest, events=events)
+team_sync = TableSync("Teams", manifest, events=events)
+games_sync = TableSync("Games", manifest, events=events)
+standings_sync = TableSync("Standings", manifest, events=events)
+all_syncs = [
+    leagues_sync,
+    tournaments_sync,
+    matches_sync,
+    player_sync,
+    team_sync,
+    games_sync,
+    standings_sync,
+]
+
+LEAGUE_QUERY = CargoQuery(
+    tables="Leagues=L",
+    fields="L.League, L.League_Short, L.Region, L.Level, L.IsOfficial",
+)
+
+TOURNAMENT_QUERY = CargoQuery(
+    tables="Tournaments=T,Leagues=L",
+    join_on="L.League=T.League",
+    fields="T.Name, T.OverviewPage, T.DateStart, T.IsQualifier, T.IsPlayoffs, T.IsOfficial, T.Year, L.League_Short, T.Date, L.League",
+    order_by="T.OverviewPage",
+)
+
+# One row per match, the join with MatchScheduleGame only adds the first game's vod
+MATCH_QUERY = CargoQuery(
+    tables="MatchSchedule=MS,Tournaments=T,MatchScheduleGame=MSG",
+    join_on="MS.OverviewPage=T.OverviewPage,MS.MatchId=MSG.MatchId",
+    fields="MS.MatchId,MS.OverviewPage,T.Name,T.League,MS.Team1,MS.Team2,"
+    "MS.Patch,MS.DateTime_UTC,MS.Winner,MS.Team1Score,MS.Team2Score,MS.BestOf,"
+    "MSG.VodGameStart,MS.VodHighlights",
+    order_by="MS.DateTime_UTC,MS.MatchId",
+    filters=(Eq("MSG.N_GameInMatch", 1),),
+)
+
+# One row per player, ordered so the rows of a game are consecutive across pages.
+# The tournament's league is only joined in for the shard filter
+GAME_QUERY = CargoQuery(
+    tables="ScoreboardGames=SG,ScoreboardPlayers=SP,Tournaments=T",
+    join_on="SG.GameId=SP.GameId,SG.OverviewPage=T.OverviewPage",
+    fields="T.League,SG.GameId,SG.MatchId,SG.OverviewPage,SG.Tournament,SG.Team1,SG.Team2,SG.WinTeam,"
+    "SG.DateTime_UTC,SG.Patch,SG.Gamelength,SG.Team1Bans,SG.Team2Bans,"
+    "SG.Team1Gold,SG.Team2Gold,SG.Team1Kills,SG.Team2Kills,SG.Team1Towers,SG.Team2Towers,"
+    "SG.Team1Inhibitors,SG.Team2Inhibitors,SG.Team1Dragons,SG.Team2Dragons,"
+    "SG.Team1Barons,SG.Team2Barons,SG.Team1RiftHeralds,SG.Team2RiftHeralds,"
+    "SP.Link,SP.Team,SP.Champion,SP.IngameRole,SP.Side,SP.Kills,SP.Deaths,SP.Assists,"
+    "SP.Gold,SP.CS,SP.DamageToChampions,SP.VisionScore,SP.SummonerSpells,SP.Items,SP.Trinket",
+    order_by="SG.GameId,SP.Side,SP.IngameRole",
+)
+
+PLAYER_QUERY = CargoQuery(
+    tables="Players=P",
+    fields="P.ID, P.Country, P.Age, P.Team, P.Residency, P.Role, P.IsSubstitute",
+)
+
+# Every team including disbanded ones
+TEAM_QUERY = CargoQuery(
+    tables="Teams=Te",
+    fields="Te.Name, Te.Short, Te.Location, Te.Region, Te.IsDisbanded",
+)
+ACTIVE_TEAM_QUERY = TEAM_QUERY.where(Eq("Te.IsDisbanded", 0))
+
+# How far ahead the daemon looks for matches to poll closely
+LIVE_MATCH_HORIZON = datetime.timedelta(days=1)
+
+# What a regular, non historical run reloads, everything older is assumed settled
+RECENT_TOURNEYS = ThisYear("T.DateStart")
+# Vods and highlights are added up to a week late, matches further out than two weeks
+# are not scheduled for sure yet
+RECENT_MATCHES = Recent(
+    "MS.DateTime_UTC",
+    before=datetime.timedelta(weeks=1),
+    after=datetime.timedelta(weeks=2),
+)
+
+
+def configure_shard(shard: Shard, rate_budget: Optional[str] = None):
+    """Loads only the leagues of one shard, and what belongs to them, from now on.
+
+    Watermarks are kept per shard. With a rate_budget file every shard draws from one
+    shared Leaguepedia budget, without one each shard gets 1/N of the configured rate.
+    """
+    global SHARD, watermarks, checkpoints
+    SHARD = shard
+    watermarks = Watermarks(state_path(f"watermarks{shard.suffix}.json"))
+    checkpoints = Checkpoints(state_path(f"checkpoints{shard.suffix}.json"))
+    limiter = leaguepedia.rate_limiter
+    if rate_budget:
+        leaguepedia.rate_limiter = SharedRateLimiter(
+            rate_budget, limiter.max_rate, limiter.burst
+        )
+    else:
+        leaguepedia.rate_limiter = RateLimiter(
+            limiter.max_rate / shard.count, max(1, limiter.burst // shard.count)
+        )
+    metrics.name = f"metrics{shard.suffix}"
+    metrics.labels["shard"] = str(shard)
+    logger.info(f"Loading shard {shard}")
+
+
+def in_shard(league) -> bool:
+    """Whether this process loads the league, tournaments and matches go with their league."""
+    return SHARD is None or SHARD.owns(league)
+
+
+def checkpoint_groups(units: List[str]) -> Iterator[List[List[str]]]:
+    """Query chunks of the units, CHECKPOINT_CHUNKS at a time."""
+    chunks = list(chunk_in_values(units))
+    for start in range(0, len(chunks), CHECKPOINT_CHUNKS):
+        yield chunks[start : start + CHECKPOINT_CHUNKS]
+
+
+def start_checkpoint(loader: str) -> Checkpoint:
+    # A checkpoint only carries over to a run loading the same part of history
+    fingerprint = f"shard={SHARD} historical={LOAD_HISTORICAL}"
+    return checkpoints.start(loader, RESUME, fingerprint)
+
+
+def recent_only(query: CargoQuery, window) -> CargoQuery:
+    """Narrows a query to a window on the wiki's side, unless loading all of history."""
+    return query if LOAD_HISTORICAL else query.where(window)
+
+
+def query_changed(cargo_table: str, alias: str, query: CargoQuery) -> Iterator[dict]:
+    """Streams only the rows of cargo_table whose page changed since its watermark.
+
+    The table is joined with _pageData to get the page's _modificationDate,
+    observe the rows with a watermarks.tracker and commit it once they are synced.
+    """
+    mark = None if LOAD_HISTORICAL else watermarks.get(cargo_table)
+    query = query.join("_pageData=PD", f"{alias}._pageName=PD._pageName").select(
+        "PD._modificationDate=ModificationDate"
+    )
+    if mark:
+        # An inclusive start so rows edited in the same second as the last mark are kept
+        query = query.where(Range("PD._modificationDate", start=mark))
+    logger.info(f"Querying {cargo_table} changed since {mark or 'the beginning'}")
+    return leaguepedia.query_iter(query)
 
 
 # https://lol.fandom.com/wiki/Special:CargoTables/Leagues
+@metrics.timed("leagues")
 def load_leagues_and_return_leagues() -> List[str]:
+    """Loads the leagues of this process's shard and returns their names."""
     logger.info("Loading Leagues")
-    res = leaguepedia.query(
-        tables="Leagues", fields="League, League_Short, Region, Level, IsOfficial"
+    tracker = watermarks.tracker("Leagues")
+    if INCREMENTAL:
+        res = tracker.observe(query_changed("Leagues", "L", LEAGUE_QUERY))
+    else:
+        res = leaguepedia.query_iter(LEAGUE_QUERY)
+
+    leagues = []
+
+    def build(league):
+        if not in_shard(league["League"]):
+            return []
+        leagues.append(league["League"])
+        return [League.from_row(league)]
+
+    result = leagues_sync.sync_stream(
+        res,
+        [Stage("build", build)],
+        description="Loading Leagues",
+        write_workers=WRITE_WORKERS,
     )
-    updated_leagues = 0
-    for league in track(res, description="Loading Leagues"):
-        ddb_item = League(league)
-        existing = leagues_table.get_item(Key=ddb_item.key()).get("Item", None)
-        if existing != ddb_item.ddb_format():
-            logger.debug(
-                f"Putting updated league new: {ddb_item.ddb_format()}, old: {existing}"
-            )
-            leagues_table.put_item(Item=ddb_item.ddb_format())
-            updated_leagues += 1
-        else:
-            logger.debug(f"Skipping put for {ddb_item.leagueId}")
+    if INCREMENTAL:
+        tracker.commit()
 
-    logger.info(f"Updated {updated_leagues} leagues.")
+    logger.info(f"Updated {result.written} leagues. ({result})")
 
-    return [league["League"] for league in res]
+    return leagues
 
 
 # https://lol.fandom.com/wiki/Special:CargoTables/Tournaments
+@metrics.timed("tourneys")
 def load_tourneys_and_return_overview_pages(leagues=None) -> List:
     if leagues is None:
         leagues = load_leagues_and_return_leagues()
-    tourneys = []
+    if INCREMENTAL:
+        return load_changed_tourneys()
+    leagues = [league for league in leagues if in_shard(league)]
+    checkpoint = start_checkpoint("tourneys")
+    pending = checkpoint.pending(leagues)
+    tourneys = checkpoint.results
+    failed = set()
+    result = SyncResult()
+
+    def build(tourney):
+        if not tourney["Name"]:
+            return []
+        tourney = remap_tournaments_manual(tourney)
+        tourneys.append(tourney)
+        return [Tournament.from_row(tourney)]
+
+    with shared_progress() as progress:
+        overall = progress.add_task(
+            "Loading Tournaments",
+            total=len(leagues),
+            completed=len(leagues) - len(pending),
+        )
 
-    progress = Progress(transient=True)
-    progress.start()
-    overall = progress.add_task("Loading Tournaments", total=len(leagues))
-    updated_tourneys = 0
-    for league in leagues:
-        progress.advance(overall)
-        try:
-            res = leaguepedia.query(
-                tables="Tournaments=T,Leagues=L",
-                join_on="L.League=T.League",
-                fields="T.Name, T.OverviewPage, T.DateStart, T.IsQualifier, T.IsPlayoffs, T.IsOfficial, T.Year, L.League_Short, T.Date, L.League",
-                where=f"L.League='{league}'",
+        def fetch(chunk):
+            try:
+                yield from leaguepedia.query_iter(
+                    recent_only(TOURNAMENT_QUERY, RECENT_TOURNEYS).where(
+                        In("L.League", chunk)
+                    )
+                )
+            except (MaximumRetriesExceeded, APIError) as e:
+                logger.warning(f"Hit error querying {chunk}", exc_info=e)
+                failed.update(chunk)
+            finally:
+                progress.advance(overall, len(chunk))
+
+        for group in checkpoint_groups(pending):
+            synced = len(tourneys)
+            result += tournaments_sync.sync_stream(
+                group,
+                [Stage("fetch", fetch, workers=FETCH_WORKERS), Stage("build", build)],
+                progress=progress,
+                description="Writing Tournaments",
+                write_workers=WRITE_WORKERS,
             )
-            if SLEEP:
-                sleep(2)
-        except (MaximumRetriesExceeded, APIError) as e:
-            logger.warning(f"Hit error querying {league}", exc_info=e)
-            continue
-        res = filter(lambda x: x["Name"], res)
-        res = filter(filter_only_recent_tourneys, res)
-        res = map(remap_tournaments_manual, res)
-        res = list(res)
-
-        local_league = progress.add_task(
-            f"Loading tournaments for {league}", total=len(res)
-        )
-        for tourney in res:
-            ddb_tourney = Tournament(tourney)
-            existing = tournaments_table.get_item(Key=ddb_tourney.key()).get(
-                "Item", None
+            checkpoint.mark_done(
+                [league for chunk in group for league in chunk if league not in failed],
+                tourneys[synced:],
             )
-            if existing != ddb_tourney.ddb_format():
-                logger.debug(f"Putting new tournament {ddb_tourney}")
-                tournaments_table.put_item(Item=ddb_tourney.ddb_format())
-                updated_tourneys += 1
-            else:
-                logger.debug(f"Skipping put for {ddb_tourney.tournamentId}")
-            tourneys.append(tourney)
-            progress.advance(local_league)
-        progress.stop_task(local_league)
-        progress.update(local_league, visible=False)
-    progress.stop_task(overall)
-    progress.stop()
-    logger.info(f"Updated {updated_tourneys} Tourneys")
+        progress.stop_task(overall)
+        progress.update(overall, visible=False)
+    # Failed leagues stay pending for the next --resume
+    if not failed:
+        checkpoint.finish()
+    logger.info(f"Updated {result.written} Tourneys ({result})")
+    return tourneys
+
+
+# Tournaments of every league whose page changed since the watermark
+def load_changed_tourneys() -> List:
+    tracker = watermarks.tracker("Tournaments")
+    tourneys = []
+
+    def build(tourney):
+        if not tourney["Name"] or not in_shard(tourney["League"]):
+            return []
+        tourney = remap_tournaments_manual(tourney)
+        tourneys.append(tourney)
+        return [Tournament.from_row(tourney)]
+
+    result = tournaments_sync.sync_stream(
+        tracker.observe(query_changed("Tournaments", "T", TOURNAMENT_QUERY)),
+        [Stage("build", build)],
+        description="Writing Tournaments",
+        write_workers=WRITE_WORKERS,
+    )
+    tracker.commit()
+    logger.info(f"Updated {result.written} Tourneys ({result})")
     return tourneys
 
 
@@ -134,118 +358,421 @@ def remap_tournaments_manual(tourney):
     return tourney
 
 
-# Filter out tourneys not from this year
-def filter_only_recent_tourneys(tourney):
-    if LOAD_HISTORICAL:
-        return True
-    try:
-        date = datetime.datetime.strptime(tourney["DateStart"], "%Y-%m-%d")
-    except (TypeError, ValueError):
-        return False
+def build_matches(page: List[dict]) -> List[Match]:
+    return Match.from_rows(match for match in page if in_shard(match["League"]))
 
-    return date.year == datetime.datetime.now().year
 
+def sync_matches(
+    source, stages: List[Stage], progress: Optional[Progress] = None
+) -> SyncResult:
+    """Streams pages of match rows into Matches and logs the updates per tournament."""
+    updated = Counter()
+    lock = threading.Lock()
 
-def load_matches_thread(overview_page, progress: Progress, overall: TaskID):
-    name = overview_page["Name"]
-    try:
-        res = leaguepedia.query(
-            tables="MatchSchedule=MS,Tournaments=T,MatchScheduleGame=MSG",
-            join_on="MS.OverviewPage=T.OverviewPage,MS.MatchId=MSG.MatchId",
-            fields="MS.MatchId,MS.OverviewPage,T.Name,MS.Team1,MS.Team2,"
-            "MS.Patch,MS.DateTime_UTC,MS.Winner,MS.BestOf,MSG.VodGameStart,MS.VodHighlights",
-            where=f"T.Name='{name}' AND MSG.N_GameInMatch=1",
-            order_by="MS.DateTime_UTC",
-        )
-    except (MaximumRetriesExceeded, APIError) as e:
-        logger.warning(f"Hit Error for {name}", exc_info=e)
-        return
-
-    res = list(filter(filter_only_recent_matches, res))
-    logger.debug(f"Found results: {res}")
-    local_matches = progress.add_task(
-        f"Loading Matches for {overview_page['Name']}", total=len(res)
+    def count_write(match, old):
+        with lock:
+            updated[match.tournamentId] += 1
+
+    result = matches_sync.sync_stream(
+        source,
+        stages + [Stage("build", build_matches, queue_size=PAGE_QUEUE_SIZE)],
+        progress=progress,
+        description="Writing Matches",
+        write_workers=WRITE_WORKERS,
+        on_write=count_write,
     )
-    updated_matches = 0
-    for match in res:
-        ddb_item = Match(match)
-        existing = matches_table.get_item(Key=ddb_item.key()).get("Item", None)
-        if existing != ddb_item.ddb_format():
-            logger.debug(
-                f"Putting new match {ddb_item.ddb_format()}, old match {existing}"
-            )
-            matches_table.put_item(Item=ddb_item.ddb_format())
-            updated_matches += 1
-        else:
-            logger.debug(f"Skipping upload for {ddb_item.matchId}")
-        progress.advance(local_matches)
-    logger.info(f"Updated {updated_matches} for {name}")
-    progress.stop_task(local_matches)
-    progress.update(local_matches, visible=False)
-    progress.advance(overall)
+    for tournament_id, count in sorted(updated.items()):
+        logger.info(f"Updated {count} for {tournament_id}")
+    tournaments_with_match_changes.update(updated)
+    team_resolver.report_unresolved()
+    return result
 
 
 # https://lol.fandom.com/wiki/Special:CargoTables/MatchSchedule
+@metrics.timed("matches")
 def load_matches(tourneys=None):
     if tourneys is None:
         tourneys = load_tourneys_and_return_overview_pages()
+    if INCREMENTAL:
+        return load_changed_matches()
+
+    names = list(
+        dict.fromkeys(
+            overview_page["Name"]
+            for overview_page in tourneys
+            if in_shard(overview_page["League"])
+        )
+    )
+    checkpoint = start_checkpoint("matches")
+    pending = checkpoint.pending(names)
+    failed = set()
+    total = SyncResult()
+    with shared_progress() as progress:
+        overall = progress.add_task(
+            "Loading Matches", total=len(names), completed=len(names) - len(pending)
+        )
+
+        # Each fetch worker pages through one batched query worth of tournaments
+        def fetch(chunk):
+            try:
+                yield from leaguepedia.query_pages(
+                    recent_only(MATCH_QUERY, RECENT_MATCHES).where(In("T.Name", chunk))
+                )
+            except (MaximumRetriesExceeded, APIError) as e:
+                logger.warning(f"Hit Error for {chunk}", exc_info=e)
+                failed.update(chunk)
+            finally:
+                progress.advance(overall, len(chunk))
+
+        for group in checkpoint_groups(pending):
+            total += sync_matches(
+                group, [Stage("fetch", fetch, workers=MATCH_WORKERS)], progress
+            )
+            checkpoint.mark_done(
+                [name for chunk in group for name in chunk if name not in failed]
+            )
+
+        progress.stop_task(overall)
+        progress.update(overall, visible=False)
+    if not failed:
+        checkpoint.finish()
+    logger.info(
+        f"Updated {total.written} Matches across {len(tourneys)} Tourneys ({total})"
+    )
+    return total
 
-    progress = Progress(transient=True)
-    progress.start()
-    overall = progress.add_task("Loading Matches", total=len(tourneys))
-    for overview_page in tourneys:
-        load_matches_thread(overview_page, progress, overall)
-        if SLEEP:
-            sleep(2)
 
-    progress.stop_task(overall)
-    progress.stop()
+# Matches of every tournament whose page changed since the watermark
+def load_changed_matches():
+    tracker = watermarks.tracker("MatchSchedule")
+    total = sync_matches(
+        tracker.observe(query_changed("MatchSchedule", "MS", MATCH_QUERY)),
+        [batched(leaguepedia.limit, "page")],
+    )
+    # Only reached when every stage succeeded, otherwise the old mark is kept
+    tracker.commit()
+    logger.info(f"Updated {total.written} changed Matches ({total})")
+    return total
 
 
-# Adding this filter to reduce the cost of DDB Writes.
-def filter_only_recent_matches(match):
-    if LOAD_HISTORICAL:
-        return True
-    try:
-        date = datetime.datetime.strptime(match["DateTime UTC"], "%Y-%m-%d %H:%M:%S")
-    except (TypeError, ValueError):
-        return False
-    now = datetime.datetime.now()
+# https://lol.fandom.com/wiki/Special:CargoTables/MatchSchedule
+@metrics.timed("live_matches")
+def load_live_matches(calendar: MatchCalendar):
+    """Reloads the matches being played or starting within a day, for the daemon.
+
+    Their rows are handed to the calendar, so it knows when to look again. The response
+    cache is skipped, its MatchSchedule TTL is longer than the live poll interval.
+    """
+    now = datetime.datetime.now(datetime.UTC).replace(microsecond=0, tzinfo=None)
+    query = MATCH_QUERY.where(
+        Range("MS.DateTime_UTC", now - calendar.live_for, now + LIVE_MATCH_HORIZON)
+    )
+
+    def fetch(query):
+        for page in leaguepedia.query_pages(query, cached=False):
+            calendar.observe(match for match in page if in_shard(match["League"]))
+            yield page
+
+    total = sync_matches([query], [Stage("fetch", fetch)])
+    logger.info(f"Updated {total.written} live Matches ({total})")
+    return total
+
 
-    # If the match is older than 1 week we don't need to update it. Vods/highlights are updated late
-    # If the match is farther than 2 weeks in the future don't worry about it
-    return now - datetime.timedelta(weeks=1) < date < now + datetime.timedelta(weeks=2)
+def group_games(rows: Iterator[dict]) -> Iterator[Game]:
+    """Builds one Game per run of consecutive player rows with the same GameId."""
+    for _, players in itertools.groupby(rows, key=lambda row: row["GameId"]):
+        yield Game.from_player_rows(list(players))
+
+
+# Tournaments whose matches were written by this process, their standings are recomputed
+tournaments_with_match_changes = set()
+
+
+# https://lol.fandom.com/wiki/Special:CargoTables/ScoreboardGames
+@metrics.timed("games")
+def load_games(tourneys=None):
+    """Loads the games of the given tournaments, with every player's scoreboard.
+
+    Each fetch worker streams one chunk of tournaments and groups the rows of a game,
+    so memory stays bounded by the pipeline queues whatever the number of games.
+    """
+    if tourneys is None:
+        tourneys = load_tourneys_and_return_overview_pages()
+    if INCREMENTAL:
+        return load_changed_games()
+    pages = list(
+        dict.fromkeys(
+            tourney["OverviewPage"]
+            for tourney in tourneys
+            if in_shard(tourney["League"])
+        )
+    )
+    with shared_progress() as progress:
+        overall = progress.add_task("Loading Games", total=len(pages))
+
+        def fetch(chunk):
+            try:
+                yield from group_games(
+                    leaguepedia.query_iter(
+                        GAME_QUERY.where(In("SG.OverviewPage", chunk))
+                    )
+                )
+            except (MaximumRetriesExceeded, APIError) as e:
+                logger.warning(f"Hit Error for {chunk}", exc_info=e)
+            finally:
+                progress.advance(overall, len(chunk))
+
+        result = games_sync.sync_stream(
+            list(chunk_in_values(pages)),
+            [Stage("fetch", fetch, workers=MATCH_WORKERS)],
+            progress=progress,
+            description="Writing Games",
+            write_workers=WRITE_WORKERS,
+        )
+        progress.stop_task(overall)
+        progress.update(overall, visible=False)
+    team_resolver.report_unresolved()
+    logger.info(
+        f"Updated {result.written} Games across {len(pages)} Tourneys ({result})"
+    )
+    return result
+
+
+# Games whose scoreboard page changed since the watermark
+def load_changed_games():
+    """Loads the games whose ScoreboardGames page changed since the last run.
+
+    Scoreboards are often published after their match row stopped changing, so
+    `all` and the daemon follow this watermark instead of the written matches.
+    The first run without a watermark loads every game.
+    """
+    tracker = watermarks.tracker("ScoreboardGames")
+    rows = tracker.observe(query_changed("ScoreboardGames", "SG", GAME_QUERY))
+    result = games_sync.sync_stream(
+        group_games(row for row in rows if in_shard(row["League"])),
+        [],
+        description="Writing Games",
+        write_workers=WRITE_WORKERS,
+    )
+    tracker.commit()
+    team_resolver.report_unresolved()
+    logger.info(f"Updated {result.written} changed Games ({result})")
+    return result
+
+
+# Derived from the Matches table, one item per tournament
+@metrics.timed("standings")
+def load_standings(tournament_ids: Iterable[str]):
+    """Recomputes the standings of the given tournaments from their Matches items.
+
+    Only tournaments whose matches were just written are passed in, each costs one
+    consistent Query of its whole Matches partition and at most one write. Streaks
+    depend on the order of every result, so they are not patched from the written rows.
+    """
+    tournament_ids = sorted(tournament_ids)
+
+    def build(tournament_id):
+        matches = matches_sync.query("tournamentId", tournament_id)
+        return [Standings.from_matches(tournament_id, matches)]
+
+    result = standings_sync.sync_stream(
+        tournament_ids,
+        [Stage("build", build, workers=FETCH_WORKERS)],
+        description="Writing Standings",
+        write_workers=WRITE_WORKERS,
+    )
+    logger.info(
+        f"Updated {result.written} Standings of {len(tournament_ids)} Tourneys ({result})"
+    )
+    return result
+
+
+# The matches command, Standings follow the matches it wrote like in load_all
+def load_matches_and_standings():
+    load_matches()
+    load_standings(tournaments_with_match_changes)
+
+
+# Repairs the whole table, e.g. after Matches were edited by hand or seeded by a backfill
+def rebuild_standings():
+    tournament_ids = {
+        match["tournamentId"]
+        for match in matches_sync.scan(ProjectionExpression="tournamentId")
+    }
+    return load_standings(tournament_ids)
 
 
 # https://lol.fandom.com/wiki/Special:CargoTables/Players
+@metrics.timed("players")
 def load_players():
-    res = leaguepedia.query(
-        tables="Players", fields="ID, Country, Age, Team, Residency, Role, IsSubstitute"
+    tracker = watermarks.tracker("Players")
+    if INCREMENTAL:
+        res = tracker.observe(query_changed("Players", "P", PLAYER_QUERY))
+        stages = [batched(leaguepedia.limit, "page")]
+    else:
+        res = leaguepedia.query_pages(PLAYER_QUERY)
+        stages = []
+    result = player_sync.sync_stream(
+        res,
+        stages + [Stage("build", Player.from_rows, queue_size=PAGE_QUEUE_SIZE)],
+        description="Loading Players",
+        write_workers=WRITE_WORKERS,
     )
-    for player in track(res):
-        ddb_item = Player(player)
-        existing = player_table.get_item(Key=ddb_item.key()).get("Item", None)
-        if existing != ddb_item.ddb_format():
-            logger.debug(
-                f"Putting new player: {ddb_item.ddb_format()}, existing: {existing}"
-            )
-            player_table.put_item(Item=ddb_item.ddb_format())
-        else:
-            logger.debug(f"Skipping player {ddb_item.id}")
+    team_resolver.report_unresolved()
+    if INCREMENTAL:
+        tracker.commit()
+    logger.info(f"Updated {result.written} Players ({result})")
 
 
 # https://lol.fandom.com/wiki/Special:CargoTables/Teams
-def load_teams():
-    res = leaguepedia.query(
-        tables="Teams",
-        fields="Name, Short, Location, Region, IsDisbanded",
-        where="IsDisbanded=0",
+@metrics.timed("teams")
+def load_teams(teams=None):
+    tracker = watermarks.tracker("Teams")
+    if teams is not None:
+        res = [team for team in teams if team["IsDisbanded"] == "0"]
+    elif INCREMENTAL:
+        res = tracker.observe(query_changed("Teams", "Te", ACTIVE_TEAM_QUERY))
+    else:
+        res = leaguepedia.query_iter(ACTIVE_TEAM_QUERY)
+    result = team_sync.sync_stream(
+        res,
+        [Stage("build", lambda team: [Team.from_row(team)])],
+        description="Loading Teams",
+        write_workers=WRITE_WORKERS,
     )
-    for team in track(res):
-        ddb_item = Team(team)
-        existing = team_table.get_item(Key=ddb_item.key()).get("Item", None)
-        if existing != ddb_item.ddb_format():
-            logger.debug(f"Putting team new: {ddb_item.ddb_format()}, old: {existing}")
-            team_table.put_item(Item=ddb_item.ddb_format())
-        else:
-            logger.debug(f"Skipping team {ddb_item.teamId}")
+    if INCREMENTAL and teams is None:
+        tracker.commit()
+    logger.info(f"Updated {result.written} Teams ({result})")
+
+
+# Every team including disbanded ones, shared by the Teams loader and the team code index
+@metrics.timed("query_teams")
+def query_teams(cached: bool = True) -> List:
+    return leaguepedia.query(TEAM_QUERY, cached=cached)
+
+
+def load_all(standings: bool = True):
+    """Runs every loader once as a DAG so each cargo query happens exactly once.
+
+    leagues -> tourneys -> matches and teams -> team_index -> players/matches/games,
+    independent branches run side by side and results are handed over in memory.
+    Without standings the Standings table is left alone, it is read back from Matches.
+    """
+    if INCREMENTAL:
+        # Only changed teams are fetched, so the index keeps building itself
+        team_stages = {
+            "team_table": (load_teams, []),
+            "team_index": (lambda: team_resolver.index, []),
+        }
+    else:
+        team_stages = {
+            "teams": (query_teams, []),
+            "team_table": (lambda teams: load_teams(teams), ["teams"]),
+            "team_index": (lambda teams: team_resolver.rebuild(teams), ["teams"]),
+        }
+    stages = {
+        "leagues": (load_leagues_and_return_leagues, []),
+        "tourneys": (
+            lambda leagues: load_tourneys_and_return_overview_pages(leagues),
+            ["leagues"],
+        ),
+        **team_stages,
+        "players": (lambda team_index: load_players(), ["team_index"]),
+        "matches": (
+            lambda tourneys, team_index: load_matches(tourneys),
+            ["tourneys", "team_index"],
+        ),
+        # Games whose scoreboards changed, whether or not their matches did
+        "games": (lambda team_index: load_changed_games(), ["team_index"]),
+    }
+    if standings:
+        # Standings of tournaments whose matches were just written
+        stages["standings"] = (
+            lambda matches: load_standings(tournaments_with_match_changes),
+            ["matches"],
+        )
+    if SHARD is not None and SHARD.index != 0:
+        # Players and Teams are not partitioned, the first shard loads them
+        del stages["players"], stages["team_table"]
+    run_dag(stages)
+
+
+# Cargo tables with a watermark, the backfill snapshot is where incremental runs pick up
+WATERMARKED_TABLES = [
+    "Leagues",
+    "Tournaments",
+    "MatchSchedule",
+    "Players",
+    "Teams",
+    "ScoreboardGames",
+]
+
+
+def use_syncs(syncs: List):
+    """Points the loaders at other syncs, in the order of all_syncs."""
+    global leagues_sync, tournaments_sync, matches_sync, player_sync, team_sync
+    global games_sync, standings_sync
+    (
+        leagues_sync,
+        tournaments_sync,
+        matches_sync,
+        player_sync,
+        team_sync,
+        games_sync,
+        standings_sync,
+    ) = syncs
+
+
+def backfill(directory: str):
+    """Exports all of history to DynamoDB ImportTable files instead of writing the tables.
+
+    Every loader runs with LOAD_HISTORICAL against an ImportFileSync per table and
+    `<directory>/manifest.json` lists the files and item counts. Seed new tables from the
+    uploaded files, then run rebuild-manifest and rebuild-standings and continue with
+    incremental runs.
+    """
+    global LOAD_HISTORICAL, INCREMENTAL, RESUME
+    snapshot_at = datetime.datetime.now(datetime.UTC).strftime("%Y-%m-%d %H:%M:%S")
+    saved = (LOAD_HISTORICAL, INCREMENTAL, RESUME, all_syncs)
+    # Shards write their own parts and manifest into the same directory
+    suffix = SHARD.suffix if SHARD else ""
+    exports = [
+        ImportFileSync(directory, table_sync.table_name, prefix=f"part{suffix}")
+        for table_sync in all_syncs
+    ]
+    # The parts are written from scratch, so nothing can be resumed
+    LOAD_HISTORICAL, INCREMENTAL, RESUME = True, False, False
+    use_syncs(exports)
+    try:
+        # Standings are computed from the Matches table once it was imported
+        load_all(standings=False)
+    finally:
+        LOAD_HISTORICAL, INCREMENTAL, RESUME, syncs = saved
+        use_syncs(syncs)
+        tables = {export.table_name: export.close() for export in exports}
+    # ImportTable needs at least one file
+    tables = {name: table for name, table in tables.items() if table["items"]}
+
+    with open(os.path.join(directory, f"manifest{suffix}.json"), "w") as f:
+        json.dump({"snapshotAt": snapshot_at, "tables": tables}, f, indent=2)
+    # Rows changed after the snapshot are picked up by the next incremental run
+    for cargo_table in WATERMARKED_TABLES:
+        watermarks.set_if_newer(cargo_table, snapshot_at)
+    for name, table in tables.items():
+        logger.info(f"Exported {table['items']} {name} in {len(table['files'])} files")
+
+
+def verify_manifest():
+    for table_sync in all_syncs:
+        table_sync.verify_manifest()
+
+
+# Run after tables were edited by hand so the manifest matches DynamoDB again
+def rebuild_manifest():
+    for table_sync in all_syncs:
+        table_sync.rebuild_manifest()
+
+
+# Next incremental run loads everything again
+def reset_watermarks():
+    watermarks.reset()
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import threading
+from time import time
+from typing import Callable, Dict, Optional
+
+from util.state import state_path
+
+logger = logging.getLogger(__name__)
+
+# Seconds a cached page stays fresh, per cargo table. Joins use the shortest TTL of their tables
+DEFAULT_TTLS = {
+    "Leagues": 6 * 60 * 60,
+    "Teams": 6 * 60 * 60,
+    "TeamRedirects": 6 * 60 * 60,
+    "Players": 60 * 60,
+    "Tournaments": 30 * 60,
+    "MatchSchedule": 5 * 60,
+    "MatchScheduleGame": 5 * 60,
+}
+DEFAULT_TTL = 5 * 60
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class CacheMiss(Exception):
+    """Raised in replay mode when a query was never cached."""
+
+
+def _normalize(value):
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", re.sub(r"\s*,\s*", ",", value.strip()))
+    return value
+
+
+def cache_key(params: dict) -> str:
+    normalized = {key.lower(): _normalize(value) for key, value in params.items()}
+    encoded = json.dumps(normalized, sort_keys=True, default=str)
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+
+def query_tables(params: dict) -> list:
+    """Table names of a query, `tables="MatchSchedule=MS,Tournaments=T"` -> [MatchSchedule, Tournaments]."""
+    return [
+        table.split("=")[0].strip()
+        for table in str(params.get("tables", "")).split(",")
+        if table.strip()
+    ]
+
+
+class ResponseCache:
+    """Disk backed cache of cargo response pages keyed by normalized query params and offset.
+
+    Pages expire per table TTL, the file is capped at max_bytes by evicting the least
+    recently used pages and identical concurrent requests share a single fetch.
+    In replay mode pages never expire and nothing is fetched from the wiki.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        ttls: Optional[Dict[str, int]] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        replay_only: bool = False,
+    ):
+        self._path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_bytes = max_bytes
+        self.replay_only = replay_only
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, threading.Event] = {}
+        # Opened on first use, importing the loaders touches no local state
+        self._connection = None
+
+    @property
+    def path(self) -> str:
+        return str(self._path or state_path("cargo_cache.sqlite3"))
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # Only used with self._lock held
+        if self._connection is None:
+            # Shards share the file, wait for each other's writes instead of failing
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "key TEXT PRIMARY KEY, ttl INTEGER NOT NULL, fetched_at REAL NOT NULL, "
+                "accessed_at REAL NOT NULL, size INTEGER NOT NULL, rows TEXT NOT NULL)"
+            )
+            conn.commit()
+            self._connection = conn
+        return self._connection
+
+    def ttl(self, params: dict) -> int:
+        return min(
+            (self.ttls.get(table, DEFAULT_TTL) for table in query_tables(params)),
+            default=DEFAULT_TTL,
+        )
+
+    def get(self, key: str) -> Optional[list]:
+        now = time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT ttl, fetched_at, rows FROM pages WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            ttl, fetched_at, rows = row
+            if not self.replay_only and fetched_at + ttl < now:
+                return None
+            self._conn.execute(
+                "UPDATE pages SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+        return json.loads(rows)
+
+    def put(self, key: str, ttl: int, rows: list):
+        encoded = json.dumps(rows)
+        now = time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO pages (key, ttl, fetched_at, accessed_at, size, rows) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, ttl, now, now, len(encoded), encoded),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM pages"
+        ).fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM pages ORDER BY accessed_at"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM pages WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+        logger.debug(f"Evicted {evicted} cached cargo pages")
+
+    def get_or_fetch(self, params: dict, fetch: Callable[[], list]) -> list:
+        key = cache_key(params)
+        rows = self.get(key)
+        if rows is not None:
+            return rows
+        if self.replay_only:
+            raise CacheMiss(f"No cached response for {params}")
+
+        with self._lock:
+            event = self._inflight.get(key)
+            owner = event is None
+            if owner:
+                event = threading.Event()
+                self._inflight[key] = event
+
+        if not owner:
+            event.wait()
+            rows = self.get(key)
+            # The owner failed, try on our own
+            return rows if rows is not None else fetch()
+
+        try:
+            rows = fetch()
+            self.put(key, self.ttl(params), rows)
+            return rows
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+
+def cache_from_env(mode: str) -> Optional[ResponseCache]:
+    """`off` disables caching, `replay` serves only from the cache, anything else caches."""
+    if mode == "off":
+        return None
+    return ResponseCache(replay_only=mode == "replay")
@@ -0,0 +1,168 @@
+import datetime
+from dataclasses import dataclass, replace
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+# Keep batched where clauses well below the wiki's URL and query length limits
+MAX_IN_VALUES = 50
+MAX_IN_CLAUSE_CHARS = 1500
+
+
+def quote(value) -> str:
+    """Quotes a value as a Cargo (MySQL) string literal."""
+    if isinstance(value, datetime.datetime):
+        value = value.strftime("%Y-%m-%d %H:%M:%S")
+    elif isinstance(value, datetime.date):
+        value = value.isoformat()
+    escaped = str(value).replace("\\", "\\\\").replace("'", "''")
+    return f"'{escaped}'"
+
+
+def in_clause(field: str, values: Iterable) -> str:
+    return f"{field} IN ({', '.join(quote(value) for value in values)})"
+
+
+def chunk_in_values(
+    values: Iterable,
+    max_values: int = MAX_IN_VALUES,
+    max_chars: int = MAX_IN_CLAUSE_CHARS,
+) -> Iterator[List]:
+    """Splits values into chunks whose quoted IN list stays under the limits."""
+    chunk = []
+    chars = 0
+    for value in values:
+        size = len(quote(value)) + 2
+        if chunk and (len(chunk) >= max_values or chars + size > max_chars):
+            yield chunk
+            chunk = []
+            chars = 0
+        chunk.append(value)
+        chars += size
+    if chunk:
+        yield chunk
+
+
+# Typed filters, compiled into the where clause so unwanted rows never leave the wiki
+
+
+@dataclass(frozen=True)
+class Eq:
+    field: str
+    value: object
+
+    def compile(self) -> str:
+        return f"{self.field}={quote(self.value)}"
+
+
+@dataclass(frozen=True)
+class In:
+    field: str
+    values: Tuple
+
+    def __post_init__(self):
+        object.__setattr__(self, "values", tuple(self.values))
+
+    def compile(self) -> str:
+        return in_clause(self.field, self.values)
+
+
+@dataclass(frozen=True)
+class Range:
+    """start <= field < end, either bound may be left open.
+
+    Rows where the field is NULL never match, as with any SQL comparison.
+    """
+
+    field: str
+    start: Optional[object] = None
+    end: Optional[object] = None
+
+    def compile(self) -> str:
+        bounds = []
+        if self.start is not None:
+            bounds.append(f"{self.field} >= {quote(self.start)}")
+        if self.end is not None:
+            bounds.append(f"{self.field} < {quote(self.end)}")
+        return " AND ".join(bounds)
+
+
+@dataclass(frozen=True)
+class Recent:
+    """A window of whole UTC days around today, resolved when the query is compiled.
+
+    Whole days keep the compiled query, and so its cache key, the same all day.
+    """
+
+    field: str
+    before: datetime.timedelta
+    after: datetime.timedelta = datetime.timedelta(0)
+
+    def compile(self) -> str:
+        today = datetime.datetime.now(datetime.UTC).date()
+        return Range(
+            self.field,
+            today - self.before,
+            today + self.after + datetime.timedelta(days=1),
+        ).compile()
+
+
+@dataclass(frozen=True)
+class ThisYear:
+    """Dates in the current UTC year, resolved when the query is compiled."""
+
+    field: str
+
+    def compile(self) -> str:
+        year = datetime.datetime.now(datetime.UTC).year
+        return Range(
+            self.field, datetime.date(year, 1, 1), datetime.date(year + 1, 1, 1)
+        ).compile()
+
+
+Filter = Union[Eq, In, Range, Recent, ThisYear]
+
+
+def compile_where(filters: Iterable[Filter]) -> Optional[str]:
+    clauses = [clause for clause in (f.compile() for f in filters) if clause]
+    if not clauses:
+        return None
+    return " AND ".join(clauses)
+
+
+@dataclass(frozen=True)
+class CargoQuery:
+    """A cargo query whose where clause is built from typed filters.
+
+    Queries are immutable, where() returns a copy with more filters so a module level
+    query can be narrowed per call.
+    """
+
+    tables: str
+    fields: str
+    join_on: Optional[str] = None
+    order_by: Optional[str] = None
+    filters: Tuple[Filter, ...] = ()
+
+    def where(self, *filters: Filter) -> "CargoQuery":
+        return replace(self, filters=self.filters + filters)
+
+    def join(self, table: str, on: str) -> "CargoQuery":
+        return replace(
+            self,
+            tables=f"{self.tables},{table}",
+            join_on=",".join(filter(None, [self.join_on, on])),
+        )
+
+    def select(self, fields: str) -> "CargoQuery":
+        return replace(self, fields=f"{self.fields},{fields}")
+
+    def params(self) -> dict:
+        """The keyword arguments of cargo_client.query."""
+        params = {"tables": self.tables, "fields": self.fields}
+        if self.join_on:
+            params["join_on"] = self.join_on
+        where = compile_where(self.filters)
+        if where:
+            params["where"] = where
+        if self.order_by:
+            params["order_by"] = self.order_by
+        return params
@@ -1,73 +1,322 @@
+import logging
 import os
-from datetime import timedelta
-from time import sleep
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
 
-from mwrogue.auth_credentials import AuthCredentials
-from mwrogue.esports_client import EsportsClient
+from mwclient.errors import APIError, MaximumRetriesExceeded
+from requests.exceptions import RequestException
+
+from leaguepedia.cache import ResponseCache, cache_from_env, query_tables
+from leaguepedia.cargo import CargoQuery
+from leaguepedia.rate_limiter import RateLimiter
+from leaguepedia.session import SessionCache, session_cache_from_env
+from util.metrics import metrics
+
+# API error codes meaning the wiki wants us to slow down. mwclient handles maxlag itself
+# and raises MaximumRetriesExceeded for it, see LeaguepediaSite._request_page
+THROTTLE_ERROR_CODES = {"ratelimited"}
+
+logger = logging.getLogger(__name__)
 
 
 class LeaguepediaSite:
     """A ghost loaded class that handles Leaguepedia connection and some caching.
 
+    Every request goes through one rate limiter, so a single instance can be shared
+    by all threads and coroutines of a run. With a cache, pages are served from disk
+    while fresh and identical concurrent requests are only fetched once. With
+    prefetch_workers above 1, results of more than one page are read several pages
+    at a time, see query_pages.
+
     Full documentation: https://lol.fandom.com/Help:API_Documentation
     """
 
     def __init__(
-        self, limit=500, delay_between: timedelta = timedelta(milliseconds=250)
+        self,
+        limit=500,
+        requests_per_second: float = 4,
+        burst: int = 4,
+        max_page_retries: int = 5,
+        cache: Optional[ResponseCache] = None,
+        session_cache: Optional[SessionCache] = None,
+        prefetch_workers: int = 1,
     ):
         self._site = None
         self.limit = limit
-        self.delay_between = delay_between
+        self.prefetch_workers = prefetch_workers
+        self.rate_limiter = RateLimiter(requests_per_second, burst)
+        self.max_page_retries = max_page_retries
+        self.cache = cache
+        self.session_cache = session_cache
+        self._site_lock = threading.Lock()
 
     @property
     def site(self):
         if not self._site:
-            self._load_site()
+            with self._site_lock:
+                if not self._site:
+                    self._load_site()
 
         return self._site
 
     def _load_site(self):
         """Creates site class fields.
 
-        Used for ghost loading the class during package import.
+        Used for ghost loading the class during package import. The wiki libraries are
+        imported here too, they are slow to import and most commands never need them.
+        A login saved by an earlier run is reused, otherwise the bot logs in and saves it.
+        """
+        from mwcleric.clients.site import Site
+        from mwrogue.auth_credentials import AuthCredentials
+        from mwrogue.esports_client import EsportsClient
+
+        credentials = AuthCredentials(
+            username=os.environ["LEAGUEPEDIA_USERNAME"],
+            password=os.environ["LEAGUEPEDIA_PASSWORD"],
+        )
+
+        # Same client the session manager builds from these credentials. login() still
+        # requests siteinfo, only a run reusing a saved session skips it
+        client = Site(
+            "lol.fandom.com",
+            path="/",
+            max_retries=0,
+            clients_useragent=credentials.user_agent,
+            custom_headers={},
+            do_init=False,
+        )
+        cache = self.session_cache
+        if cache and cache.restore(client.connection.cookies, credentials.username):
+            logger.info("Reusing the saved wiki session")
+        else:
+            client.login(username=credentials.username, password=credentials.password)
+            if cache:
+                cache.save(client.connection.cookies, credentials.username)
+
+        self._site = EsportsClient("lol", client=client)
+
+    def _fetch_page(self, offset: int, cached: bool = True, **kwargs) -> list:
+        if self.cache is None or not cached:
+            return self._request_page(offset, **kwargs)
+        fetched = []
+
+        def fetch():
+            fetched.append(offset)
+            return self._request_page(offset, **kwargs)
+
+        page = self.cache.get_or_fetch(
+            {"limit": self.limit, "offset": offset, **kwargs}, fetch
+        )
+        if not fetched:
+            metrics.inc("cargo_cache_hits", table=_metric_table(kwargs))
+        return page
+
+    def _request_page(self, offset: int, **kwargs) -> list:
+        """Fetches one page, retrying only this page with backoff when it fails."""
+        table = _metric_table(kwargs)
+        attempt = 0
+        while True:
+            self.rate_limiter.acquire()
+            metrics.inc("cargo_requests", table=table)
+            try:
+                rows = self.site.cargo_client.query(
+                    limit=self.limit, offset=offset, **kwargs
+                )
+            except APIError as e:
+                if e.code in THROTTLE_ERROR_CODES:
+                    metrics.inc("cargo_throttled", table=table)
+                if (
+                    e.code not in THROTTLE_ERROR_CODES
+                    or attempt >= self.max_page_retries
+                ):
+                    raise
+                error = e
+            except (MaximumRetriesExceeded, RequestException) as e:
+                # The client has max_retries=0, so maxlag and server errors land here at
+                # once and this loop is their only retry, paced by the rate limiter
+                if isinstance(e, MaximumRetriesExceeded):
+                    metrics.inc("cargo_throttled", table=table)
+                if attempt >= self.max_page_retries:
+                    raise
+                error = e
+            else:
+                self.rate_limiter.success()
+                metrics.inc("cargo_pages", table=table)
+                metrics.inc("cargo_rows", len(rows), table=table)
+                return rows
+            attempt += 1
+            metrics.inc("cargo_retries", table=table)
+            logger.warning(
+                f"Retrying page at offset {offset} of {kwargs.get('tables')} "
+                f"(attempt {attempt}): {error}"
+            )
+            self.rate_limiter.backoff(retry_after=min(2**attempt, 60))
+
+    def query_pages(
+        self, query: Optional[CargoQuery] = None, cached: bool = True, **kwargs
+    ) -> Iterator[List[dict]]:
+        """Yields the non-empty pages of a cargo query.
+
+        The query is either a CargoQuery or the raw cargo params as keywords.
+        Only one page is held at a time and a failed page is retried on its own,
+        so pages already yielded are never fetched again. cached=False reads past the
+        response cache, for queries that must see the wiki as it is now.
+
+        With prefetch_workers, a full first page is followed by a COUNT of the result
+        and the remaining pages are fetched up to prefetch_workers at a time, still
+        through the rate limiter, and yielded in order. Each of them starts at the last
+        row of the page before, so rows inserted or deleted on the wiki mid-read show
+        up as a page not starting where the previous one ended. The read then finds
+        that row again and carries on from it one page at a time.
         """
-        # If not, we create the self.client object as our way to interact with the wiki
-        leaguepedia_username = os.environ["LEAGUEPEDIA_USERNAME"]
-        leaguepedia_password = os.environ["LEAGUEPEDIA_PASSWORD"]
-
-        self._site = EsportsClient(
-            "lol",
-            credentials=AuthCredentials(
-                username=leaguepedia_username, password=leaguepedia_password
-            ),
+        if query is not None:
+            kwargs = {**query.params(), **kwargs}
+        # Handed to every _fetch_page along with the cargo params
+        kwargs["cached"] = cached
+        # Counting a grouped query counts the rows before grouping
+        if self.prefetch_workers > 1 and not kwargs.get("group_by"):
+            yield from self._prefetch_pages(kwargs)
+            return
+        offset = 0
+        while True:
+            page = self._fetch_page(offset=offset, **kwargs)
+            if page:
+                yield page
+            # A short or empty page is the last one
+            if len(page) < self.limit:
+                return
+            offset += len(page)
+
+    def _prefetch_pages(self, kwargs: dict) -> Iterator[List[dict]]:
+        first = self._fetch_page(offset=0, **kwargs)
+        if first:
+            yield first
+        if len(first) < self.limit:
+            return
+        total = self._count(kwargs)
+        # Every page after the first overlaps the one before by a row
+        step = self.limit - 1
+        executor = ThreadPoolExecutor(max_workers=self.prefetch_workers)
+        prefetcher = _Prefetcher(
+            lambda offset: executor.submit(self._fetch_page, offset=offset, **kwargs),
+            range(step, total - 1, step) if total else [],
+            window=2 * self.prefetch_workers,
         )
+        try:
+            yield from self._pages_after(first[-1], step, kwargs, prefetcher)
+        finally:
+            prefetcher.drop()
+            executor.shutdown(cancel_futures=True)
+
+    def _count(self, kwargs: dict) -> Optional[int]:
+        """Rows of a cargo query, None when the count could not be read."""
+        params = {
+            key: kwargs[key]
+            for key in ("tables", "join_on", "where")
+            if kwargs.get(key)
+        }
+        rows = self._fetch_page(
+            offset=0, cached=kwargs["cached"], fields="COUNT(*)=RowCount", **params
+        )
+        try:
+            return int(rows[0]["RowCount"])
+        except (IndexError, KeyError, TypeError, ValueError):
+            logger.warning(
+                f"Could not count the rows of {kwargs.get('tables')}: {rows}"
+            )
+            return None
+
+    def _pages_after(
+        self, anchor: dict, offset: int, kwargs: dict, prefetcher: "_Prefetcher"
+    ) -> Iterator[List[dict]]:
+        """Yields the pages after the row anchor, which was last seen at offset."""
+        while True:
+            page = prefetcher.get(offset)
+            if page is None:
+                page = self._fetch_page(offset=offset, **kwargs)
+            start, index = offset, 0
+            if not page or page[0] != anchor:
+                # Rows moved, the offsets planned from the count are off from here on
+                prefetcher.drop()
+                metrics.inc("cargo_drift", table=_metric_table(kwargs))
+                start = max(0, offset - self.limit // 2)
+                page = self._fetch_page(offset=start, **kwargs)
+                index = next((i for i, row in enumerate(page) if row == anchor), None)
+                if index is None:
+                    logger.warning(
+                        f"Rows of {kwargs.get('tables')} moved by more than half a page "
+                        f"while reading, rows around offset {offset} may be missing or repeated"
+                    )
+                    index = offset - start
+                else:
+                    logger.info(
+                        f"Rows of {kwargs.get('tables')} moved by {start + index - offset} "
+                        f"while reading, continuing after the last row read"
+                    )
+            rows = page[index + 1 :]
+            if rows:
+                yield rows
+            if len(page) < self.limit:
+                return
+            anchor, offset = page[-1], start + len(page) - 1
+
+    def query_iter(
+        self, query: Optional[CargoQuery] = None, **kwargs
+    ) -> Iterator[dict]:
+        """Yields the rows of a cargo query page by page, see query_pages."""
+        for page in self.query_pages(query, **kwargs):
+            yield from page
 
-    def query(self, **kwargs) -> list:
+    def query(self, query: Optional[CargoQuery] = None, **kwargs) -> list:
         """Issues a cargo query to leaguepedia.
 
-        Params are usually:
+        Params are a CargoQuery or usually:
             tables, join_on, fields, order_by, where
 
         Returns:
             List of rows from the query.
         """
-        result = []
+        return list(self.query_iter(query, **kwargs))
 
-        # We check if we hit the API limit
-        while len(result) % self.limit == 0:
-            result.extend(
-                self.site.cargo_client.query(
-                    limit=self.limit, offset=len(result), **kwargs
-                )
-            )
 
-            # If the cargoquery is empty, we stop the loop
-            if not result:
-                break
-            sleep(self.delay_between.total_seconds())
+class _Prefetcher:
+    """Keeps up to window of the planned pages of one read in flight, in offset order."""
+
+    def __init__(
+        self, submit: Callable[[int], Future], offsets: Iterable[int], window: int
+    ):
+        self._submit = submit
+        self._offsets = deque(offsets)
+        self._window = window
+        self._futures: Dict[int, Future] = {}
+
+    def get(self, offset: int) -> Optional[list]:
+        """The page at offset if it was planned, None to fetch it directly."""
+        while self._offsets and len(self._futures) < self._window:
+            planned = self._offsets.popleft()
+            self._futures[planned] = self._submit(planned)
+        future = self._futures.pop(offset, None)
+        return future.result() if future else None
+
+    def drop(self):
+        self._offsets.clear()
+        for future in self._futures.values():
+            future.cancel()
+        self._futures.clear()
+
 
-        return result
+def _metric_table(params: dict) -> str:
+    tables = query_tables(params)
+    return tables[0] if tables else ""
 
 
 # Ghost loaded instance shared by all other classes
-leaguepedia = LeaguepediaSite()
+leaguepedia = LeaguepediaSite(
+    requests_per_second=float(os.environ.get("LEAGUEPEDIA_REQUESTS_PER_SECOND", 4)),
+    burst=int(os.environ.get("LEAGUEPEDIA_BURST", 4)),
+    cache=cache_from_env(os.environ.get("LEAGUEPEDIA_CACHE", "on")),
+    session_cache=session_cache_from_env(os.environ.get("LEAGUEPEDIA_SESSION_MAX_AGE")),
+    prefetch_workers=int(os.environ.get("LEAGUEPEDIA_PREFETCH_WORKERS", 1)),
+)
@@ -0,0 +1,134 @@
+import asyncio
+import fcntl
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from time import monotonic, sleep, time
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Adaptive token bucket shared by every thread and coroutine using a site.
+
+    Tokens refill at `rate` per second up to `burst`. backoff() halves the rate when
+    the wiki pushes back and success() adds it back slowly up to requests_per_second.
+    """
+
+    def __init__(
+        self,
+        requests_per_second: float = 4,
+        burst: int = 4,
+        min_rate: float = 0.2,
+        recovery_step: float = 0.1,
+    ):
+        self.max_rate = requests_per_second
+        self.min_rate = min(min_rate, requests_per_second)
+        self.recovery_step = recovery_step
+        self.burst = burst
+        self.rate = requests_per_second
+        self._tokens = float(burst)
+        self._updated_at = monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Takes a token, possibly going into debt, and returns how long to wait for it."""
+        with self._lock:
+            now = monotonic()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated_at) * self.rate
+            )
+            self._updated_at = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait > 0:
+            sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def backoff(self, retry_after: float = 0.0):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            # Drain the bucket so nobody bursts straight back into the limit
+            self._tokens = min(self._tokens, 0.0) - retry_after * self.rate
+        logger.info(f"Leaguepedia pushed back, slowing down to {self.rate:.2f} req/s")
+
+    def success(self):
+        if self.rate >= self.max_rate:
+            return
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.recovery_step)
+
+
+class SharedRateLimiter(RateLimiter):
+    """RateLimiter whose bucket lives in a file so several processes share one budget.
+
+    Every change happens under an exclusive flock of the file, a backoff in one process
+    slows all of them down. Clocks are wall time since processes don't share monotonic().
+    """
+
+    def __init__(
+        self, path: str, requests_per_second: float = 4, burst: int = 4, **kwargs
+    ):
+        super().__init__(requests_per_second, burst, **kwargs)
+        self.path = str(path)
+
+    @contextmanager
+    def _shared_state(self):
+        with self._lock, open(self.path, "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                content = f.read()
+                state = json.loads(content) if content else {}
+                state.setdefault("rate", self.max_rate)
+                state.setdefault("tokens", float(self.burst))
+                state.setdefault("updated_at", time())
+                yield state
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                f.flush()
+                os.fsync(f.fileno())
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _reserve(self) -> float:
+        with self._shared_state() as state:
+            now = time()
+            state["tokens"] = min(
+                self.burst,
+                state["tokens"] + max(0.0, now - state["updated_at"]) * state["rate"],
+            )
+            state["updated_at"] = now
+            state["tokens"] -= 1
+            self.rate = state["rate"]
+            if state["tokens"] >= 0:
+                return 0.0
+            return -state["tokens"] / state["rate"]
+
+    def backoff(self, retry_after: float = 0.0):
+        with self._shared_state() as state:
+            state["rate"] = max(self.min_rate, state["rate"] / 2)
+            state["tokens"] = min(state["tokens"], 0.0) - retry_after * state["rate"]
+            self.rate = state["rate"]
+        logger.info(
+            f"Leaguepedia pushed back, slowing all shards to {self.rate:.2f} req/s"
+        )
+
+    def success(self):
+        if self.rate >= self.max_rate:
+            return
+        with self._shared_state() as state:
+            state["rate"] = min(self.max_rate, state["rate"] + self.recovery_step)
+            self.rate = state["rate"]
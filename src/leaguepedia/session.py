@@ -0,0 +1,80 @@
+import json
+import logging
+import os
+from time import time
+from typing import Optional
+
+from util.state import state_path
+
+logger = logging.getLogger(__name__)
+
+# Seconds a saved login is reused, MediaWiki drops idle sessions after about an hour
+DEFAULT_MAX_AGE = 60 * 60
+
+
+class SessionCache:
+    """Keeps the cookies of a logged in wiki session on disk so runs can skip the login.
+
+    A saved session is used until it is max_age old or one of its cookies expired.
+    Should the wiki have dropped it earlier, cargo queries still work with the
+    anonymous limits until the next login.
+    """
+
+    def __init__(self, path: Optional[str] = None, max_age: int = DEFAULT_MAX_AGE):
+        self.path = str(path or state_path("wiki_session.json"))
+        self.max_age = max_age
+
+    def restore(self, jar, username: str) -> bool:
+        """Loads the saved cookies of username into the requests cookie jar."""
+        from requests.cookies import create_cookie
+
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return False
+        now = time()
+        if (
+            saved.get("username") != username
+            or saved.get("savedAt", 0) + self.max_age < now
+        ):
+            return False
+        cookies = saved.get("cookies", [])
+        if not cookies or any(c["expires"] and c["expires"] < now for c in cookies):
+            return False
+        for cookie in cookies:
+            jar.set_cookie(create_cookie(**cookie))
+        return True
+
+    def save(self, jar, username: str):
+        cookies = [
+            {
+                "name": cookie.name,
+                "value": cookie.value,
+                "domain": cookie.domain,
+                "path": cookie.path,
+                "expires": cookie.expires,
+                "secure": cookie.secure,
+            }
+            for cookie in jar
+        ]
+        tmp = f"{self.path}.tmp"
+        # The cookies log in as the bot, keep them private
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"username": username, "savedAt": time(), "cookies": cookies}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def session_cache_from_env(value: Optional[str]) -> Optional[SessionCache]:
+    """LEAGUEPEDIA_SESSION_MAX_AGE: seconds to reuse a login, 0 logs in on every run."""
+    max_age = DEFAULT_MAX_AGE if value is None else int(value)
+    if max_age <= 0:
+        return None
+    return SessionCache(max_age=max_age)
@@ -1,32 +1,141 @@
-from argparse import ArgumentParser
+import logging
+import os
+import sys
+from argparse import SUPPRESS, ArgumentParser
+from types import ModuleType
+from typing import Callable
 
-from data_loading import (
-    load_players,
-    load_teams,
-    load_leagues_and_return_leagues,
-    load_matches,
-    load_tourneys_and_return_overview_pages,
-)
+from util.shard import Shard
+
+
+# The modules behind the subcommands, imported only once one runs so --help starts
+# instantly. Plain import statements let PyInstaller find them for the binary
+def _data_loading():
+    import data_loading
+
+    return data_loading
+
+
+def _daemon():
+    import daemon
+
+    return daemon
+
+
+def _reconcile():
+    import reconcile
+
+    return reconcile
+
+
+COMMAND_MODULES = [_data_loading, _daemon, _reconcile]
+# Players and Teams have no partitions, loading them per shard would repeat the whole table
+UNSHARDED_COMMANDS = ["players", "teams"]
+
+
+def command(name: str, module: Callable[[], ModuleType] = _data_loading):
+    """A subcommand's function, looked up in its module once it runs."""
+
+    def run(**kwargs):
+        return getattr(module(), name)(**kwargs)
+
+    return run
 
 
 def get_arg_parser() -> ArgumentParser:
     parser = ArgumentParser()
-    subparsers = parser.add_subparsers()
+    parser.add_argument(
+        "--shard",
+        type=Shard.parse,
+        help="Only load the leagues and tournaments of shard i/N, e.g. 0/4",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        help="Run the command as N local shard processes sharing one rate budget",
+    )
+    parser.add_argument("--rate-budget", help=SUPPRESS)
+    # Imports every subcommand's module and exits, the smoke check of the built binary
+    parser.add_argument("--check-imports", action="store_true", help=SUPPRESS)
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue the tourneys and matches loaders from their last checkpoint",
+    )
+    subparsers = parser.add_subparsers(dest="command")
+
+    everything = subparsers.add_parser("all")
+    everything.set_defaults(func=command("load_all"))
 
     leagues = subparsers.add_parser("leagues")
-    leagues.set_defaults(func=load_leagues_and_return_leagues)
+    leagues.set_defaults(func=command("load_leagues_and_return_leagues"))
 
     tourneys = subparsers.add_parser("tourneys")
-    tourneys.set_defaults(func=load_tourneys_and_return_overview_pages)
+    tourneys.set_defaults(func=command("load_tourneys_and_return_overview_pages"))
 
-    games = subparsers.add_parser("matches")
-    games.set_defaults(func=load_matches)
+    matches = subparsers.add_parser("matches")
+    matches.set_defaults(func=command("load_matches_and_standings"))
 
     players = subparsers.add_parser("players")
-    players.set_defaults(func=load_players)
+    players.set_defaults(func=command("load_players"))
+
+    games = subparsers.add_parser("games")
+    games.set_defaults(func=command("load_games"))
 
     teams = subparsers.add_parser("teams")
-    teams.set_defaults(func=load_teams)
+    teams.set_defaults(func=command("load_teams"))
+
+    verify = subparsers.add_parser("verify-manifest")
+    verify.set_defaults(func=command("verify_manifest"))
+
+    rebuild = subparsers.add_parser("rebuild-manifest")
+    rebuild.set_defaults(func=command("rebuild_manifest"))
+
+    standings = subparsers.add_parser(
+        "rebuild-standings",
+        help="Recompute the standings of every tournament in Matches",
+    )
+    standings.set_defaults(func=command("rebuild_standings"))
+
+    reconcile = subparsers.add_parser(
+        "reconcile", help="Delete items whose rows were deleted or renamed on the wiki"
+    )
+    reconcile.add_argument(
+        "--dry-run", action="store_true", help="Only report the orphans, delete nothing"
+    )
+    reconcile.add_argument(
+        "--max-delete-fraction",
+        type=float,
+        default=0.05,
+        help="Leave a table alone when more of its checked keys than this are orphans",
+    )
+    reconcile.set_defaults(func=command("reconcile", _reconcile))
+
+    reset = subparsers.add_parser("reset-watermarks")
+    reset.set_defaults(func=command("reset_watermarks"))
+
+    export = subparsers.add_parser(
+        "backfill", help="Export all of history as DynamoDB ImportTable files"
+    )
+    export.add_argument("directory", help="Where to write the gzip DynamoDB JSON files")
+    export.set_defaults(func=command("backfill"))
+
+    daemon = subparsers.add_parser(
+        "daemon", help="Keep running and refresh every table as often as it changes"
+    )
+    daemon.add_argument(
+        "--live-interval",
+        type=float,
+        default=5,
+        help="Minutes between polls while matches are live or about to start",
+    )
+    daemon.add_argument(
+        "--idle-interval",
+        type=float,
+        default=60,
+        help="Most minutes between two polls of the live matches",
+    )
+    daemon.set_defaults(func=command("run_daemon", _daemon))
 
     return parser
 
@@ -35,10 +144,62 @@ def main():
     cmd_parser = get_arg_parser()
     cmd = cmd_parser.parse_args()
 
-    if not hasattr(cmd, "func"):
+    if cmd.check_imports:
+        for module in COMMAND_MODULES:
+            print(f"Imported {module().__name__}")
+    elif not hasattr(cmd, "func"):
         cmd_parser.print_help()
+    elif (cmd.shard or cmd.shards) and cmd.command in UNSHARDED_COMMANDS:
+        cmd_parser.error(
+            f"{cmd.command} is not partitioned, run it without --shard or --shards"
+        )
     else:
-        cmd.func()
+        from rich.logging import RichHandler
+
+        if os.environ.get("LOADER_EVENTS") == "stdout":
+            import rich
+
+            # Logs and progress go to stderr, stdout only carries the change events
+            rich.reconfigure(stderr=True)
+
+        logging.basicConfig(level="INFO", datefmt="[%X]", handlers=[RichHandler()])
+
+        import data_loading
+        from util.launcher import launch_shards
+        from util.metrics import metrics
+
+        args = vars(cmd)
+        func = args.pop("func")
+        args.pop("command")
+        args.pop("check_imports")
+        shard, shards, rate_budget = (
+            args.pop("shard"),
+            args.pop("shards"),
+            args.pop("rate_budget"),
+        )
+        if args.pop("resume"):
+            data_loading.RESUME = True
+        if shards:
+            sys.exit(launch_shards(shards, _without_shards(sys.argv[1:])))
+        if shard:
+            data_loading.configure_shard(shard, rate_budget)
+        try:
+            func(**args)
+        finally:
+            metrics.write()
+
+
+def _without_shards(argv):
+    args = []
+    skip = False
+    for arg in argv:
+        if skip:
+            skip = False
+        elif arg == "--shards":
+            skip = True
+        elif not arg.startswith("--shards="):
+            args.append(arg)
+    return args
 
 
 if __name__ == "__main__":
@@ -0,0 +1,133 @@
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import List, Tuple
+
+from models.record import Record
+from util.datetime import transform_datetime_utc
+from util.team_info import get_team_code_from_name
+
+
+@dataclass(frozen=True, slots=True)
+class PlayerGameStats(Record):
+    id: str
+    teamId: str
+    champion: str
+    role: str
+    side: int
+    kills: int
+    deaths: int
+    assists: int
+    gold: int
+    cs: int
+    damageDealt: int
+    visionScore: int
+    summonerSpells: Tuple[str, ...]
+    items: Tuple[str, ...]
+    trinket: str
+
+    @classmethod
+    def from_row(cls, player) -> "PlayerGameStats":
+        return cls(
+            id=player["Link"],
+            teamId=get_team_code_from_name(player["Team"]),
+            champion=player["Champion"],
+            role=player["IngameRole"],
+            side=to_int(player["Side"]),
+            kills=to_int(player["Kills"]),
+            deaths=to_int(player["Deaths"]),
+            assists=to_int(player["Assists"]),
+            gold=to_int(player["Gold"]),
+            cs=to_int(player["CS"]),
+            damageDealt=to_int(player["DamageToChampions"]),
+            visionScore=to_int(player["VisionScore"]),
+            summonerSpells=split_list(player["SummonerSpells"]),
+            items=split_list(player["Items"]),
+            trinket=player["Trinket"],
+        )
+
+
+@dataclass(frozen=True, slots=True)
+class Game(Record):
+    """One game of a match with the scoreboard of all its players embedded."""
+
+    matchId: str
+    gameId: str
+    blueTeamId: str
+    redTeamId: str
+    winner: str
+    startTime: Decimal
+    patch: str
+    gameLength: str
+    blueBans: Tuple[str, ...]
+    redBans: Tuple[str, ...]
+    blueGold: int
+    redGold: int
+    blueKills: int
+    redKills: int
+    blueTowers: int
+    redTowers: int
+    blueInhibitors: int
+    redInhibitors: int
+    blueDragons: int
+    redDragons: int
+    blueBarons: int
+    redBarons: int
+    blueHeralds: int
+    redHeralds: int
+    players: Tuple[PlayerGameStats, ...]
+
+    @classmethod
+    def from_player_rows(cls, rows: List[dict]) -> "Game":
+        """Builds a game from its joined rows, one per player."""
+        game = rows[0]
+        blueTeamId = get_team_code_from_name(game["Team1"])
+        redTeamId = get_team_code_from_name(game["Team2"])
+        if game["WinTeam"] == game["Team1"]:
+            winner = blueTeamId
+        elif game["WinTeam"] == game["Team2"]:
+            winner = redTeamId
+        else:
+            winner = None
+        return cls(
+            matchId=game["MatchId"].replace(" ", "_"),
+            gameId=game["GameId"].replace(" ", "_"),
+            blueTeamId=blueTeamId,
+            redTeamId=redTeamId,
+            winner=winner,
+            startTime=transform_datetime_utc(game["DateTime UTC"]),
+            patch=game["Patch"],
+            gameLength=game["Gamelength"],
+            blueBans=split_list(game["Team1Bans"]),
+            redBans=split_list(game["Team2Bans"]),
+            blueGold=to_int(game["Team1Gold"]),
+            redGold=to_int(game["Team2Gold"]),
+            blueKills=to_int(game["Team1Kills"]),
+            redKills=to_int(game["Team2Kills"]),
+            blueTowers=to_int(game["Team1Towers"]),
+            redTowers=to_int(game["Team2Towers"]),
+            blueInhibitors=to_int(game["Team1Inhibitors"]),
+            redInhibitors=to_int(game["Team2Inhibitors"]),
+            blueDragons=to_int(game["Team1Dragons"]),
+            redDragons=to_int(game["Team2Dragons"]),
+            blueBarons=to_int(game["Team1Barons"]),
+            redBarons=to_int(game["Team2Barons"]),
+            blueHeralds=to_int(game["Team1RiftHeralds"]),
+            redHeralds=to_int(game["Team2RiftHeralds"]),
+            players=tuple(PlayerGameStats.from_row(player) for player in rows),
+        )
+
+    def key(self):
+        return {"matchId": self.matchId, "gameId": self.gameId}
+
+
+def to_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return -1
+
+
+def split_list(value) -> Tuple[str, ...]:
+    if not value:
+        return ()
+    return tuple(part.strip() for part in value.split(",") if part.strip())
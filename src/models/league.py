@@ -1,27 +1,30 @@
 from dataclasses import dataclass
 
 from models import league_map, league_short_unique
+from models.record import Record
 
 
-@dataclass
-class League:
+@dataclass(frozen=True, slots=True)
+class League(Record):
     leagueId: str
     region: str
     isOfficial: bool
     level: str
     leagueName: str
 
-    def __init__(self, league):
-        self.leagueName = league["League"]
-        self.leagueId = league["League Short"].replace(" ", "_")
-        if self.leagueName in league_map.keys():
-            self.leagueId = league_short_unique(self.leagueName)
-        self.region = league["Region"]
-        self.isOfficial = league["IsOfficial"].lower() == "yes"
-        self.level = league["Level"]
-
-    def ddb_format(self):
-        return self.__dict__
+    @classmethod
+    def from_row(cls, league) -> "League":
+        leagueName = league["League"]
+        leagueId = league["League Short"].replace(" ", "_")
+        if leagueName in league_map.keys():
+            leagueId = league_short_unique(leagueName)
+        return cls(
+            leagueId=leagueId,
+            region=league["Region"],
+            isOfficial=league["IsOfficial"].lower() == "yes",
+            level=league["Level"],
+            leagueName=leagueName,
+        )
 
     def key(self):
         return {"leagueId": self.leagueId}
@@ -1,46 +1,70 @@
 from dataclasses import dataclass
 from decimal import Decimal
+from typing import Optional
 
+from models.record import Record
 from util.datetime import transform_datetime_utc
 from util.team_info import get_team_code_from_name
 
 
-@dataclass
-class Match:
+@dataclass(frozen=True, slots=True)
+class Match(Record):
     matchId: str
     tournamentId: str
     blueTeamId: str
     redTeamId: str
     winner: str
+    blueScore: Optional[int]
+    redScore: Optional[int]
     bestOf: int
     startTime: Decimal
     patch: str
     vod: str
     highlight: str
 
-    def __init__(self, match):
-        self.matchId = match["MatchId"].replace(" ", "_")
-        self.tournamentId = match["Name"].replace(" ", "_")
-        self.blueTeamId = get_team_code_from_name(match["Team1"])
-        self.redTeamId = get_team_code_from_name(match["Team2"])
-        self.winner = get_winner(match)
-        self.bestOf = match["BestOf"]
-        self.startTime = transform_datetime_utc(match["DateTime UTC"])
-        self.patch = match["Patch"]
-        self.vod = match["VodGameStart"]
-        self.highlight = match["VodHighlights"]
-
-    def ddb_format(self):
-        return self.__dict__
+    @classmethod
+    def from_row(cls, match) -> "Match":
+        blueTeamId = get_team_code_from_name(match["Team1"])
+        redTeamId = get_team_code_from_name(match["Team2"])
+        return cls(
+            matchId=match["MatchId"].replace(" ", "_"),
+            tournamentId=match["Name"].replace(" ", "_"),
+            blueTeamId=blueTeamId,
+            redTeamId=redTeamId,
+            winner=get_winner(match, blueTeamId, redTeamId),
+            blueScore=get_score(match["Team1Score"]),
+            redScore=get_score(match["Team2Score"]),
+            bestOf=match["BestOf"],
+            startTime=transform_datetime_utc(match["DateTime UTC"]),
+            patch=match["Patch"],
+            vod=match["VodGameStart"],
+            highlight=match["VodHighlights"],
+        )
+
+    @staticmethod
+    def key_from_row(match) -> dict:
+        """The key from_row would give the row, without building the whole match."""
+        return {
+            "tournamentId": match["Name"].replace(" ", "_"),
+            "matchId": match["MatchId"].replace(" ", "_"),
+        }
 
     def key(self):
         return {"tournamentId": self.tournamentId, "matchId": self.matchId}
 
 
-def get_winner(match):
+def get_winner(match, blue_team_id, red_team_id):
     if match["Winner"] == "1":
-        return get_team_code_from_name(match["Team1"])
+        return blue_team_id
     elif match["Winner"] == "2":
-        return get_team_code_from_name(match["Team2"])
+        return red_team_id
     else:
         return None
+
+
+def get_score(score) -> Optional[int]:
+    # Games won in the series, empty until the match was played
+    try:
+        return int(score)
+    except (TypeError, ValueError):
+        return None
@@ -1,10 +1,11 @@
 from dataclasses import dataclass
 
+from models.record import Record
 from util.team_info import get_team_code_from_name
 
 
-@dataclass
-class Player:
+@dataclass(frozen=True, slots=True)
+class Player(Record):
     id: str
     country: str
     age: int
@@ -13,17 +14,17 @@ class Player:
     role: str
     isSubstitute: bool
 
-    def __init__(self, player):
-        self.id = player["ID"]
-        self.country = player["Country"]
-        self.age = int(player["Age"] if player["Age"] else -1)
-        self.teamId = get_team_code_from_name(player["Team"])
-        self.residency = player["Residency"]
-        self.role = player["Role"]
-        self.isSubstitute = player["IsSubstitute"] == "1"
-
-    def ddb_format(self):
-        return self.__dict__
+    @classmethod
+    def from_row(cls, player) -> "Player":
+        return cls(
+            id=player["ID"],
+            country=player["Country"],
+            age=int(player["Age"] if player["Age"] else -1),
+            teamId=get_team_code_from_name(player["Team"]),
+            residency=player["Residency"],
+            role=player["Role"],
+            isSubstitute=player["IsSubstitute"] == "1",
+        )
 
     def key(self):
         return {"teamId": self.teamId, "id": self.id}
@@ -0,0 +1,67 @@
+from dataclasses import fields
+from typing import Iterable, List, Tuple
+
+from util.manifest import content_hash
+
+
+class Record:
+    """Base of the slotted, frozen model dataclasses.
+
+    The DynamoDB item and its content hash are built on first use and kept, so diffing,
+    hashing and writing a model never rebuild them. The item must not be mutated.
+    """
+
+    __slots__ = ("_item", "_hash")
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[dict]) -> List["Record"]:
+        """Builds a whole cargo page at once with the model's from_row, one pipeline hop
+        instead of one per row."""
+        return [cls.from_row(row) for row in rows]
+
+    def ddb_format(self) -> dict:
+        try:
+            return self._item
+        except AttributeError:
+            names, nested = _layout(type(self))
+            item = {name: getattr(self, name) for name in names}
+            for name in nested:
+                item[name] = _to_item(item[name])
+            object.__setattr__(self, "_item", item)
+            return item
+
+    def content_hash(self) -> str:
+        try:
+            return self._hash
+        except AttributeError:
+            item_hash = content_hash(self.ddb_format())
+            object.__setattr__(self, "_hash", item_hash)
+            return item_hash
+
+
+_layouts = {}
+
+
+def _layout(cls) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+    """Field names of a model and the ones holding tuples or records, worked out once."""
+    try:
+        return _layouts[cls]
+    except KeyError:
+        names = tuple(field.name for field in fields(cls))
+        nested = tuple(
+            field.name
+            for field in fields(cls)
+            if getattr(field.type, "__origin__", None) is tuple
+            or (isinstance(field.type, type) and issubclass(field.type, Record))
+        )
+        _layouts[cls] = names, nested
+        return _layouts[cls]
+
+
+def _to_item(value):
+    # Models hold tuples and nested records to stay immutable, DynamoDB hands back lists
+    if isinstance(value, Record):
+        return value.ddb_format()
+    if isinstance(value, tuple):
+        return [_to_item(v) for v in value]
+    return value
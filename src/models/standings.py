@@ -0,0 +1,58 @@
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+from models.record import Record
+
+
+@dataclass(frozen=True, slots=True)
+class TeamRecord(Record):
+    teamId: str
+    wins: int
+    losses: int
+    # Games won minus games lost over all decided matches
+    gameDiff: int
+    # Consecutive results up to the latest match, positive for wins, negative for losses
+    streak: int
+
+
+@dataclass(frozen=True, slots=True)
+class Standings(Record):
+    """Record of every team in one tournament, ranked, derived from its Matches items."""
+
+    tournamentId: str
+    teams: Tuple[TeamRecord, ...]
+
+    @classmethod
+    def from_matches(cls, tournament_id: str, matches: Iterable[dict]) -> "Standings":
+        results: Dict[str, List[Tuple[int, int]]] = {}
+        for match in sorted(matches, key=lambda m: (m["startTime"], m["matchId"])):
+            blue, red, winner = match["blueTeamId"], match["redTeamId"], match["winner"]
+            if winner not in (blue, red) or blue == red:
+                continue
+            diff = int(match.get("blueScore") or 0) - int(match.get("redScore") or 0)
+            results.setdefault(blue, []).append((winner == blue, diff))
+            results.setdefault(red, []).append((winner == red, -diff))
+
+        teams = []
+        for team_id, team_results in results.items():
+            wins = sum(1 for won, _ in team_results if won)
+            last = team_results[-1][0]
+            streak = 0
+            for won, _ in reversed(team_results):
+                if won != last:
+                    break
+                streak += 1
+            teams.append(
+                TeamRecord(
+                    teamId=team_id,
+                    wins=wins,
+                    losses=len(team_results) - wins,
+                    gameDiff=sum(diff for _, diff in team_results),
+                    streak=streak if last else -streak,
+                )
+            )
+        teams.sort(key=lambda t: (-t.wins, t.losses, -t.gameDiff, t.teamId))
+        return cls(tournamentId=tournament_id, teams=tuple(teams))
+
+    def key(self):
+        return {"tournamentId": self.tournamentId}
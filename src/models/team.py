@@ -1,47 +1,44 @@
 from dataclasses import dataclass
 
+from models.record import Record
 
-@dataclass
-class Team:
+
+@dataclass(frozen=True, slots=True)
+class Team(Record):
     teamId: str
     name: str
     location: str
     region: str
     isDisbanded: bool
 
-    def __init__(self, team):
-        self.teamId = swap_problematic_team_ids(team)
-        self.name = team["Name"]
-        self.location = team["Location"]
-        self.region = team["Region"]
-        self.isDisbanded = team["IsDisbanded"] == "1"
-
-    def ddb_format(self):
-        return self.__dict__
+    @classmethod
+    def from_row(cls, team) -> "Team":
+        return cls(
+            teamId=swap_problematic_team_ids(team),
+            name=team["Name"],
+            location=team["Location"],
+            region=team["Region"],
+            isDisbanded=team["IsDisbanded"] == "1",
+        )
 
     def key(self):
         return {"teamId": self.teamId}
 
 
-def swap_problematic_team_ids(team):
-    team_id = team["Short"]
-
-    if team_id == "MAD" and team["Name"] == "Mad Revolution Gaming":
-        team_id = "MAD_LAT"
-
-    if team_id == "INF" and team["Name"] == "Team Infernal Drake":
-        team_id = "TID"
-
-    if team_id == "SN" and team["Name"] == "Supernova":
-        team_id = "SNV"
+# (Short, Name) -> teamId for teams sharing a short with another team
+team_id_overrides = {
+    ("MAD", "Mad Revolution Gaming"): "MAD_LAT",
+    ("INF", "Team Infernal Drake"): "TID",
+    ("SN", "Supernova"): "SNV",
+    ("RA", "Redemption Arc"): "RAC",
+    ("V5", "Vortex Five"): "VF",
+}
 
-    if team_id == "IW" and team["Name"] == "İstanbul Wildcats":
-        team["Name"] = "Istanbul Wildcats"
+# (Short, Name) -> name we store instead
+team_name_overrides = {("IW", "İstanbul Wildcats"): "Istanbul Wildcats"}
 
-    if team_id == "RA" and team["Name"] == "Redemption Arc":
-        team_id = "RAC"
 
-    if team_id == "V5" and team["Name"] == "Vortex Five":
-        team_id = "VF"
-
-    return team_id
+def swap_problematic_team_ids(team):
+    key = (team["Short"], team["Name"])
+    team["Name"] = team_name_overrides.get(key, team["Name"])
+    return team_id_overrides.get(key, team["Short"])
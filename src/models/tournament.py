@@ -1,10 +1,11 @@
 from dataclasses import dataclass
 
 from models import league_map, league_short_unique
+from models.record import Record
 
 
-@dataclass
-class Tournament:
+@dataclass(frozen=True, slots=True)
+class Tournament(Record):
     leagueId: str
     tournamentId: str
     startDate: str
@@ -13,20 +14,21 @@ class Tournament:
     isPlayoffs: bool
     isQualifier: bool
 
-    def __init__(self, tourney):
+    @classmethod
+    def from_row(cls, tourney) -> "Tournament":
         leagueName = tourney["League"]
-        self.leagueId = tourney["League Short"].replace(" ", "_")
+        leagueId = tourney["League Short"].replace(" ", "_")
         if leagueName in league_map.keys():
-            self.leagueId = league_short_unique(leagueName)
-        self.tournamentId = tourney["Name"].replace(" ", "_")
-        self.startDate = tourney["DateStart"]
-        self.endDate = tourney["Date"]
-        self.isOfficial = tourney["IsOfficial"] == "1"
-        self.isPlayoffs = tourney["IsPlayoffs"] == "1"
-        self.isQualifier = tourney["IsQualifier"] == "1"
-
-    def ddb_format(self):
-        return self.__dict__
+            leagueId = league_short_unique(leagueName)
+        return cls(
+            leagueId=leagueId,
+            tournamentId=tourney["Name"].replace(" ", "_"),
+            startDate=tourney["DateStart"],
+            endDate=tourney["Date"],
+            isOfficial=tourney["IsOfficial"] == "1",
+            isPlayoffs=tourney["IsPlayoffs"] == "1",
+            isQualifier=tourney["IsQualifier"] == "1",
+        )
 
     def key(self):
         return {"leagueId": self.leagueId, "tournamentId": self.tournamentId}
@@ -0,0 +1,234 @@
+import json
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from typing import Dict, Iterable, List, Set, Tuple
+
+from mwclient.errors import APIError, MaximumRetriesExceeded
+
+import data_loading
+from data_loading import (
+    LEAGUE_QUERY,
+    MATCH_QUERY,
+    TOURNAMENT_QUERY,
+    in_shard,
+    load_standings,
+    query_teams,
+    remap_tournaments_manual,
+)
+from leaguepedia.cargo import In, chunk_in_values
+from leaguepedia.leaguepedia import leaguepedia
+from models.league import League
+from models.match import Match
+from models.team import Team
+from models.tournament import Tournament
+from util.ddb_sync import TableSync
+from util.metrics import metrics
+from util.state import state_path
+
+logger = logging.getLogger(__name__)
+
+# Only the keys of the matches the matches loader would write
+MATCH_KEY_QUERY = replace(MATCH_QUERY, fields="T.Name,MS.MatchId")
+
+
+class Orphans:
+    """Keys stored in DynamoDB that Cargo no longer has, per table."""
+
+    def __init__(self):
+        self.keys: Dict[str, List[dict]] = defaultdict(list)
+        self.checked: Dict[str, int] = defaultdict(int)
+        # Partitions whose Cargo query failed, never diffed so nothing is deleted from them
+        self.failed: List[str] = []
+
+    def fraction(self, table: str) -> float:
+        return (
+            len(self.keys[table]) / self.checked[table] if self.checked[table] else 0.0
+        )
+
+
+@metrics.timed("reconcile")
+def reconcile(dry_run: bool = False, max_delete_fraction: float = 0.05) -> Orphans:
+    """Deletes the items whose rows were deleted or renamed on Leaguepedia.
+
+    Each Tournaments partition (leagueId) and Matches partition (tournamentId) is listed
+    with a key-only Query and diffed against the keys Cargo returns for it, so all of
+    history is covered without scanning those tables. Games of orphaned matches go with
+    them and the standings of their tournaments are recomputed. Teams has no partitions
+    and is small, its keys are scanned.
+
+    Nothing is deleted from a table whose orphans exceed max_delete_fraction of the keys
+    checked, a broken query should not be able to empty it. Cargo is read past the
+    response cache, a stale page would make items written since look orphaned. Every
+    run writes its findings to reconcile.json in the state directory.
+    """
+    orphans = Orphans()
+    tourney_names, orphan_tourneys = find_orphan_tourneys(orphans)
+    find_orphan_matches(orphans, tourney_names, orphan_tourneys)
+    find_orphan_games(orphans)
+    shard = data_loading.SHARD
+    if shard is None or shard.index == 0:
+        find_orphan_teams(orphans)
+    orphans.keys["Standings"] = [{"tournamentId": tid} for tid in orphan_tourneys]
+
+    over_threshold = {
+        table
+        for table in ["Tournaments", "Matches", "Teams"]
+        if orphans.fraction(table) > max_delete_fraction
+    }
+    for table in over_threshold:
+        logger.error(
+            f"Not deleting {len(orphans.keys[table])} {table} orphans, more than "
+            f"{max_delete_fraction:.0%} of the {orphans.checked[table]} keys checked"
+        )
+    # Games and Standings only follow the orphans of the tables they derive from
+    if "Matches" in over_threshold:
+        over_threshold.update(["Games", "Standings"])
+    if "Tournaments" in over_threshold:
+        over_threshold.add("Standings")
+
+    deleted = {}
+    syncs = {
+        "Games": data_loading.games_sync,
+        "Matches": data_loading.matches_sync,
+        "Standings": data_loading.standings_sync,
+        "Tournaments": data_loading.tournaments_sync,
+        "Teams": data_loading.team_sync,
+    }
+    for table, table_sync in syncs.items():
+        keys = orphans.keys.get(table, [])
+        logger.info(f"{len(keys)} orphaned {table} of {orphans.checked[table]} checked")
+        if keys and not dry_run and table not in over_threshold:
+            deleted[table] = table_sync.delete(keys)
+
+    if "Matches" in deleted:
+        # Orphaned tournaments lost their standings item instead
+        load_standings(
+            {key["tournamentId"] for key in orphans.keys["Matches"]}
+            - set(orphan_tourneys)
+        )
+    write_report(orphans, dry_run, deleted)
+    return orphans
+
+
+def find_orphan_tourneys(orphans: Orphans) -> Tuple[List[str], List[str]]:
+    """Diffs every Tournaments partition of the leagues on Cargo.
+
+    Returns the names of the tournaments on Cargo and the ids of orphaned ones.
+    """
+    league_ids = {
+        row["League"]: League.from_row(row).leagueId
+        for row in leaguepedia.query_iter(LEAGUE_QUERY, cached=False)
+        if in_shard(row["League"])
+    }
+    expected: Dict[str, Set[str]] = {}
+    names = []
+    for chunk in chunk_in_values(league_ids):
+        chunk_ids = {league_ids[league] for league in chunk}
+        try:
+            rows = leaguepedia.query(
+                TOURNAMENT_QUERY.where(In("L.League", chunk)), cached=False
+            )
+        except (MaximumRetriesExceeded, APIError) as e:
+            logger.warning(f"Not reconciling leagues {sorted(chunk_ids)}", exc_info=e)
+            orphans.failed.extend(f"Tournaments/{league_id}" for league_id in chunk_ids)
+            continue
+        for league_id in chunk_ids:
+            expected.setdefault(league_id, set())
+        for row in rows:
+            if not row["Name"]:
+                continue
+            # Matches are keyed by the name before any manual remapping
+            names.append(row["Name"])
+            key = Tournament.from_row(remap_tournaments_manual(row)).key()
+            expected.setdefault(key["leagueId"], set()).add(key["tournamentId"])
+
+    diff_partitions(
+        orphans, data_loading.tournaments_sync, "leagueId", "tournamentId", expected
+    )
+    orphan_tourneys = [key["tournamentId"] for key in orphans.keys["Tournaments"]]
+    return list(dict.fromkeys(names)), orphan_tourneys
+
+
+def find_orphan_matches(
+    orphans: Orphans, tourney_names: Iterable[str], orphan_tourneys: Iterable[str]
+):
+    """Diffs the Matches partition of every tournament, all matches of orphaned ones go."""
+    expected: Dict[str, Set[str]] = {tid: set() for tid in orphan_tourneys}
+    for chunk in chunk_in_values(tourney_names):
+        try:
+            rows = leaguepedia.query(
+                MATCH_KEY_QUERY.where(In("T.Name", chunk)), cached=False
+            )
+        except (MaximumRetriesExceeded, APIError) as e:
+            logger.warning(f"Not reconciling matches of {chunk}", exc_info=e)
+            orphans.failed.extend(f"Matches/{name}" for name in chunk)
+            continue
+        for name in chunk:
+            expected.setdefault(name.replace(" ", "_"), set())
+        for row in rows:
+            key = Match.key_from_row(row)
+            expected.setdefault(key["tournamentId"], set()).add(key["matchId"])
+
+    diff_partitions(
+        orphans, data_loading.matches_sync, "tournamentId", "matchId", expected
+    )
+
+
+def find_orphan_games(orphans: Orphans):
+    """Every game of an orphaned match is an orphan too."""
+    expected = {key["matchId"]: set() for key in orphans.keys["Matches"]}
+    diff_partitions(orphans, data_loading.games_sync, "matchId", "gameId", expected)
+
+
+def find_orphan_teams(orphans: Orphans):
+    # Disbanded teams are not loaded but stay while the wiki still has them
+    expected = {Team.from_row(team).teamId for team in query_teams(cached=False)}
+    for item in data_loading.team_sync.scan(ProjectionExpression="teamId"):
+        orphans.checked["Teams"] += 1
+        if item["teamId"] not in expected:
+            orphans.keys["Teams"].append({"teamId": item["teamId"]})
+
+
+def diff_partitions(
+    orphans: Orphans,
+    table_sync: TableSync,
+    key_name: str,
+    sort_name: str,
+    expected: Dict[str, Set[str]],
+):
+    """Lists the keys of each partition and records the ones Cargo did not return."""
+
+    def diff(value):
+        stored = list(table_sync.query(key_name, value, [key_name, sort_name]))
+        return len(stored), [
+            {key_name: item[key_name], sort_name: item[sort_name]}
+            for item in stored
+            if item[sort_name] not in expected[value]
+        ]
+
+    with ThreadPoolExecutor(max_workers=data_loading.WRITE_WORKERS) as executor:
+        for checked, keys in executor.map(diff, expected):
+            orphans.checked[table_sync.table_name] += checked
+            orphans.keys[table_sync.table_name].extend(keys)
+
+
+def write_report(orphans: Orphans, dry_run: bool, deleted: dict):
+    suffix = data_loading.SHARD.suffix if data_loading.SHARD else ""
+    path = state_path(f"reconcile{suffix}.json")
+    report = {
+        "dryRun": dry_run,
+        "failedPartitions": orphans.failed,
+        "tables": {
+            table: {
+                "checked": orphans.checked[table],
+                "deleted": deleted.get(table, 0),
+                "orphans": keys,
+            }
+            for table, keys in orphans.keys.items()
+        },
+    }
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    logger.info(f"Wrote the reconciliation report to {path}")
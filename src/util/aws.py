@@ -0,0 +1,25 @@
+import threading
+
+_lock = threading.Lock()
+_dynamodb = None
+
+
+def dynamodb():
+    """The DynamoDB resource shared by all table syncs, created on first use.
+
+    Importing boto3 and loading the service model takes a good part of a short run,
+    so commands that never touch DynamoDB do not pay for it.
+    """
+    global _dynamodb
+    if _dynamodb is None:
+        with _lock:
+            if _dynamodb is None:
+                import boto3
+                from botocore.config import Config
+
+                _dynamodb = boto3.resource(
+                    "dynamodb",
+                    region_name="us-west-2",
+                    config=Config(max_pool_connections=30),
+                )
+    return _dynamodb
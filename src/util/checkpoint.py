@@ -0,0 +1,110 @@
+import json
+import logging
+import os
+import threading
+from time import time
+from typing import Iterable, List, Optional
+
+from util.state import state_path
+
+logger = logging.getLogger(__name__)
+
+# A checkpoint older than this is from a run nobody is going to resume
+MAX_AGE_SECONDS = int(os.environ.get("CHECKPOINT_MAX_AGE", 24 * 60 * 60))
+
+
+class Checkpoints:
+    """Units of work (leagues, tournaments) each loader finished, kept in a local JSON file.
+
+    A loader records a unit once everything it produced was written, so a run that dies
+    can be resumed without querying or diffing the finished units again.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._lock = threading.Lock()
+        # Read on first use, importing the loaders touches no local state
+        self._loaded: Optional[dict] = None
+
+    @property
+    def path(self) -> str:
+        return str(self._path or state_path("checkpoints.json"))
+
+    @property
+    def _loaders(self) -> dict:
+        # Only used with self._lock held
+        if self._loaded is None:
+            try:
+                with open(self.path) as f:
+                    self._loaded = json.load(f)
+            except (FileNotFoundError, ValueError):
+                self._loaded = {}
+        return self._loaded
+
+    def start(self, loader: str, resume: bool, fingerprint: str = "") -> "Checkpoint":
+        """Continues the loader's checkpoint when resuming, otherwise starts a fresh one.
+
+        A checkpoint is only continued if it is fresh and was made with the same
+        fingerprint, e.g. the same shard and history settings.
+        """
+        with self._lock:
+            saved = self._loaders.get(loader)
+            if resume and saved:
+                if saved.get("fingerprint") != fingerprint:
+                    logger.warning(
+                        f"Checkpoint of {loader} is for another setup, starting over"
+                    )
+                    saved = None
+                elif time() - saved.get("updatedAt", 0) > MAX_AGE_SECONDS:
+                    logger.warning(f"Checkpoint of {loader} expired, starting over")
+                    saved = None
+            if not resume or not saved:
+                saved = {"fingerprint": fingerprint, "done": [], "results": []}
+            saved["updatedAt"] = time()
+            self._loaders[loader] = saved
+            self._save()
+        if saved["done"]:
+            logger.info(f"Resuming {loader}, {len(saved['done'])} units already done")
+        return Checkpoint(self, loader)
+
+    def _save(self):
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self._loaders, f)
+        os.replace(tmp, self.path)
+
+
+class Checkpoint:
+    """Checkpoint of one loader run, see Checkpoints.start."""
+
+    def __init__(self, checkpoints: Checkpoints, loader: str):
+        self.checkpoints = checkpoints
+        self.loader = loader
+
+    @property
+    def _saved(self) -> dict:
+        return self.checkpoints._loaders[self.loader]
+
+    def pending(self, units: Iterable[str]) -> List[str]:
+        with self.checkpoints._lock:
+            done = set(self._saved["done"])
+        return [unit for unit in units if unit not in done]
+
+    @property
+    def results(self) -> list:
+        """Results handed downstream by the units finished before the resume."""
+        with self.checkpoints._lock:
+            return list(self._saved["results"])
+
+    def mark_done(self, units: Iterable[str], results: Iterable = ()):
+        with self.checkpoints._lock:
+            self._saved["done"].extend(units)
+            self._saved["results"].extend(results)
+            self._saved["updatedAt"] = time()
+            self.checkpoints._save()
+
+    def finish(self):
+        """The loader completed, the next run starts from scratch."""
+        with self.checkpoints._lock:
+            self.checkpoints._loaders.pop(self.loader, None)
+            self.checkpoints._save()
@@ -0,0 +1,42 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def run_dag(stages: Dict[str, Tuple[Callable, List[str]]]) -> Dict[str, Any]:
+    """Runs stages as soon as their dependencies finished, independent ones side by side.
+
+    stages maps name -> (fn, dependency names) in dependency order. fn is called with
+    the results of its dependencies as keyword arguments, so every result is computed once.
+    A failed stage fails its dependents, the first error is raised after the rest finished.
+    """
+    futures = {}
+
+    def run(name, fn, deps):
+        kwargs = {dep: futures[dep].result() for dep in deps}
+        logger.info(f"Starting stage {name}")
+        return fn(**kwargs)
+
+    # Every stage gets a thread so waiting on dependencies can never starve the pool
+    with ThreadPoolExecutor(
+        max_workers=len(stages), thread_name_prefix="stage"
+    ) as executor:
+        for name, (fn, deps) in stages.items():
+            unknown = [dep for dep in deps if dep not in futures]
+            if unknown:
+                raise ValueError(f"Stage {name} depends on {unknown} defined after it")
+            futures[name] = executor.submit(run, name, fn, deps)
+
+    errors = []
+    results = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logger.error(f"Stage {name} failed", exc_info=e)
+            errors.append(e)
+    if errors:
+        raise errors[0]
+    return results
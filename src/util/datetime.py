@@ -1,11 +1,28 @@
 from datetime import datetime
 from decimal import Decimal
+from typing import Optional
 
 
-def transform_datetime_utc(date_time) -> Decimal:
+def parse_datetime_utc(date_time) -> Optional[datetime]:
+    """Parses cargo's `YYYY-MM-DD HH:MM:SS`, slicing is several times faster than strptime."""
     try:
-        return Decimal(
-            str(datetime.strptime(date_time, "%Y-%m-%d %H:%M:%S").timestamp() * 1000)
-        )
+        if len(date_time) == 19 and date_time[4] == "-" and date_time[10] == " ":
+            return datetime(
+                int(date_time[0:4]),
+                int(date_time[5:7]),
+                int(date_time[8:10]),
+                int(date_time[11:13]),
+                int(date_time[14:16]),
+                int(date_time[17:19]),
+            )
+        return datetime.strptime(date_time, "%Y-%m-%d %H:%M:%S")
     except (TypeError, ValueError):
+        return None
+
+
+def transform_datetime_utc(date_time) -> Decimal:
+    parsed = parse_datetime_utc(date_time)
+    if parsed is None:
         return Decimal(-1)
+    # Same float -> str -> Decimal as always, so stored items keep hashing the same
+    return Decimal(str(parsed.timestamp() * 1000))
@@ -0,0 +1,320 @@
+import logging
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from time import sleep
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from rich.progress import Progress
+
+from util.aws import dynamodb
+from util.events import ChangeEvents
+from util.manifest import Manifest, scan_items
+from util.metrics import metrics
+from util.pipeline import Stage, batched, run_pipeline
+from util.progress import shared_progress
+
+logger = logging.getLogger(__name__)
+
+# BatchGetItem accepts at most 100 keys and BatchWriteItem 25 items per request
+BATCH_GET_SIZE = 100
+BATCH_WRITE_SIZE = 25
+MAX_UNPROCESSED_RETRIES = 8
+
+
+@dataclass
+class SyncResult:
+    read: int = 0
+    skipped: int = 0
+    written: int = 0
+
+    def __add__(self, other: "SyncResult") -> "SyncResult":
+        return SyncResult(
+            read=self.read + other.read,
+            skipped=self.skipped + other.skipped,
+            written=self.written + other.written,
+        )
+
+    def __str__(self):
+        return f"read {self.read}, skipped {self.skipped}, wrote {self.written}"
+
+
+class TableSync:
+    """Syncs model objects to a DynamoDB table.
+
+    Existing items are read in chunks with BatchGetItem, compared locally against
+    each model's ddb_format() and only the changed ones are written with BatchWriteItem.
+    Models need to provide key(), ddb_format() and content_hash(). on_write is called
+    with (model, old item) for every model that was written.
+
+    With a manifest, rows whose content hash matches the last write are skipped
+    before any DynamoDB read happens. With events, every written or deleted item is
+    emitted as a change event and the events are flushed once a sync or delete finished.
+    """
+
+    def __init__(
+        self,
+        table_name: str,
+        manifest: Optional[Manifest] = None,
+        ddb=None,
+        events: Optional[ChangeEvents] = None,
+    ):
+        self.table_name = table_name
+        self.manifest = manifest
+        self.events = events
+        # Created on first use, a run skipping this table never sets up boto3 for it
+        self._ddb = ddb
+        self._table = None
+
+    @property
+    def ddb(self):
+        if self._ddb is None:
+            self._ddb = dynamodb()
+        return self._ddb
+
+    @ddb.setter
+    def ddb(self, ddb):
+        self._ddb = ddb
+
+    @property
+    def table(self):
+        if self._table is None:
+            self._table = self.ddb.Table(self.table_name)
+        return self._table
+
+    @table.setter
+    def table(self, table):
+        self._table = table
+
+    @property
+    def key_names(self) -> List[str]:
+        return [key["AttributeName"] for key in self.table.key_schema]
+
+    def verify_manifest(self) -> dict:
+        return self.manifest.verify(self.table, self.key_names)
+
+    def rebuild_manifest(self) -> int:
+        return self.manifest.rebuild(self.table, self.key_names)
+
+    def scan(self, **kwargs) -> Iterator[dict]:
+        return scan_items(self.table, **kwargs)
+
+    def query(
+        self, key_name: str, value, attributes: Optional[List[str]] = None
+    ) -> Iterator[dict]:
+        """Reads every item of one partition, consistently so just written items are seen.
+
+        With attributes only those are read, e.g. the key to list a partition cheaply.
+        """
+        kwargs = dict(
+            KeyConditionExpression="#key = :value",
+            ExpressionAttributeNames={"#key": key_name},
+            ExpressionAttributeValues={":value": value},
+            ConsistentRead=True,
+            ReturnConsumedCapacity="TOTAL",
+        )
+        if attributes:
+            names = {f"#a{i}": name for i, name in enumerate(attributes)}
+            kwargs["ExpressionAttributeNames"].update(names)
+            kwargs["ProjectionExpression"] = ", ".join(names)
+        while True:
+            response = self.table.query(**kwargs)
+            metrics.inc("ddb_requests", operation="Query", table=self.table_name)
+            metrics.record_capacity(response, "read")
+            yield from response.get("Items", [])
+            if "LastEvaluatedKey" not in response:
+                return
+            kwargs["ExclusiveStartKey"] = response["LastEvaluatedKey"]
+
+    def sync_stream(
+        self,
+        source: Iterable,
+        stages: List[Stage],
+        progress: Optional[Progress] = None,
+        description: Optional[str] = None,
+        write_workers: int = 4,
+        on_write: Optional[Callable] = None,
+        queue_size: int = BATCH_GET_SIZE,
+    ) -> SyncResult:
+        """Syncs models produced by a pipeline without collecting them first.
+
+        stages turn the source into model objects, e.g. fetching cargo pages and building
+        models. The models are batched and diffed/written by write_workers concurrently.
+        Queues between stages hold queue_size items, about one batch of models, and the
+        write stage buffers two batches per worker, so a slow table holds back the reads.
+        """
+        results = []
+        with self._progress_task(progress, description, None) as advance:
+
+            def write(chunk):
+                results.append(self.sync_chunk(_dedupe_by_key(chunk), on_write))
+                advance(len(chunk))
+                return ()
+
+            try:
+                run_pipeline(
+                    source,
+                    stages
+                    + [
+                        batched(BATCH_GET_SIZE),
+                        Stage(
+                            "write",
+                            write,
+                            workers=write_workers,
+                            queue_size=2 * write_workers,
+                        ),
+                    ],
+                    queue_size=queue_size,
+                )
+            finally:
+                # Also sends what was written before a stage failed
+                if self.events:
+                    self.events.flush()
+
+        result = sum(results, SyncResult())
+        logger.debug(f"Synced {self.table_name}: {result}")
+        return result
+
+    def delete(self, keys: List[dict]) -> int:
+        """Deletes the items with these keys and forgets them in the manifest."""
+        self._write_requests([{"DeleteRequest": {"Key": key}} for key in keys])
+        if self.manifest:
+            self.manifest.remove(self.table_name, keys)
+        if self.events:
+            for key in keys:
+                self.events.emit(self.table_name, key, key, None)
+            self.events.flush()
+        metrics.inc("items_deleted", len(keys), table=self.table_name)
+        return len(keys)
+
+    def sync_chunk(
+        self, chunk: List, on_write: Optional[Callable] = None
+    ) -> SyncResult:
+        """Diffs and writes up to BATCH_GET_SIZE models with unique keys, safe to call from many threads."""
+        result = SyncResult()
+        if not chunk:
+            return result
+
+        key_names = list(chunk[0].key().keys())
+        pending = []
+        for item in chunk:
+            item_hash = item.content_hash()
+            if (
+                self.manifest
+                and self.manifest.get(self.table_name, item.key()) == item_hash
+            ):
+                result.skipped += 1
+            else:
+                pending.append((item, item_hash))
+        if not pending:
+            metrics.inc("items_skipped", result.skipped, table=self.table_name)
+            return result
+
+        existing = self._batch_get([item.key() for item, _ in pending], key_names)
+        result.read += len(existing)
+        written = []
+        for item, _ in pending:
+            new = item.ddb_format()
+            old = existing.get(_key_tuple(item.key(), key_names), None)
+            if old != new:
+                logger.debug(f"Putting {self.table_name} new: {new}, old: {old}")
+                written.append((item, old, new))
+            else:
+                logger.debug(f"Skipping {self.table_name} {item.key()}")
+                result.skipped += 1
+        self._batch_write([new for _, _, new in written])
+        result.written += len(written)
+        metrics.inc("items_skipped", result.skipped, table=self.table_name)
+        metrics.inc("items_written", result.written, table=self.table_name)
+
+        # Only record hashes once everything was written
+        if self.manifest:
+            self.manifest.update(
+                self.table_name,
+                [(item.key(), item_hash) for item, item_hash in pending],
+            )
+        if self.events:
+            for item, old, new in written:
+                self.events.emit(self.table_name, item.key(), old, new)
+        if on_write:
+            for item, old, _ in written:
+                on_write(item, old)
+        return result
+
+    @contextmanager
+    def _progress_task(
+        self, progress: Optional[Progress], description: Optional[str], total
+    ):
+        with ExitStack() as stack:
+            if progress is None:
+                progress = stack.enter_context(shared_progress())
+            task = progress.add_task(
+                description or f"Syncing {self.table_name}", total=total
+            )
+            try:
+                yield lambda count: progress.advance(task, count)
+            finally:
+                progress.stop_task(task)
+                progress.update(task, visible=False)
+
+    def _batch_get(self, keys: List[dict], key_names: List[str]) -> dict:
+        """Reads the given keys, retrying any UnprocessedKeys with exponential backoff."""
+        existing = {}
+        request = {self.table_name: {"Keys": keys}}
+        attempt = 0
+        while request:
+            response = self.ddb.batch_get_item(
+                RequestItems=request, ReturnConsumedCapacity="TOTAL"
+            )
+            metrics.inc("ddb_requests", operation="BatchGetItem", table=self.table_name)
+            metrics.record_capacity(response, "read")
+            for item in response["Responses"].get(self.table_name, []):
+                existing[_key_tuple(item, key_names)] = item
+            request = response.get("UnprocessedKeys") or {}
+            if request:
+                attempt += 1
+                if attempt > MAX_UNPROCESSED_RETRIES:
+                    raise RuntimeError(
+                        f"Gave up on {len(request[self.table_name]['Keys'])} unprocessed keys for {self.table_name}"
+                    )
+                logger.debug(f"Retrying unprocessed keys for {self.table_name}")
+                sleep(min(0.05 * 2**attempt, 5))
+        return existing
+
+    def _batch_write(self, items: List[dict]):
+        self._write_requests([{"PutRequest": {"Item": item}} for item in items])
+
+    def _write_requests(self, requests: List[dict]):
+        """Sends put or delete requests 25 at a time, retrying any UnprocessedItems with
+        exponential backoff."""
+        for start in range(0, len(requests), BATCH_WRITE_SIZE):
+            request = {self.table_name: requests[start : start + BATCH_WRITE_SIZE]}
+            attempt = 0
+            while request:
+                response = self.ddb.batch_write_item(
+                    RequestItems=request, ReturnConsumedCapacity="TOTAL"
+                )
+                metrics.inc(
+                    "ddb_requests", operation="BatchWriteItem", table=self.table_name
+                )
+                metrics.record_capacity(response, "write")
+                request = response.get("UnprocessedItems") or {}
+                if request:
+                    attempt += 1
+                    if attempt > MAX_UNPROCESSED_RETRIES:
+                        raise RuntimeError(
+                            f"Gave up on {len(request[self.table_name])} unprocessed items for {self.table_name}"
+                        )
+                    logger.debug(f"Retrying unprocessed items for {self.table_name}")
+                    sleep(min(0.05 * 2**attempt, 5))
+
+
+def _key_tuple(item: dict, key_names: List[str]) -> tuple:
+    return tuple(item[name] for name in key_names)
+
+
+def _dedupe_by_key(items: List) -> List:
+    """BatchGetItem and BatchWriteItem reject duplicate keys in one request, the last row wins."""
+    deduped = {}
+    for item in items:
+        deduped[tuple(item.key().items())] = item
+    return list(deduped.values())
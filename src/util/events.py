@@ -0,0 +1,220 @@
+import json
+import logging
+import sys
+import threading
+from decimal import Decimal
+from time import sleep
+from typing import List, Optional
+
+from util.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Events buffered before they are sent, even when the stage is still running
+MAX_BUFFERED = 1000
+MAX_SEND_RETRIES = 8
+# SQS SendMessageBatch takes at most 10 messages, Kinesis PutRecords 500 records
+SQS_BATCH_SIZE = 10
+KINESIS_BATCH_SIZE = 500
+
+
+def change_event(
+    table: str, key: dict, old: Optional[dict], new: Optional[dict]
+) -> dict:
+    """What changed in one item, only the changed attributes carry their values.
+
+    type is INSERT without an old item, REMOVE without a new one and MODIFY otherwise.
+    """
+    old_item, new_item = old or {}, new or {}
+    changed = sorted(
+        name
+        for name in old_item.keys() | new_item.keys()
+        if name not in key and old_item.get(name) != new_item.get(name)
+    )
+    return {
+        "table": table,
+        "type": "INSERT" if old is None else "REMOVE" if new is None else "MODIFY",
+        "key": key,
+        "changed": changed,
+        "old": {name: old_item[name] for name in changed if name in old_item},
+        "new": {name: new_item[name] for name in changed if name in new_item},
+    }
+
+
+def _json_default(value):
+    # DynamoDB hands numbers back as Decimal
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, (set, frozenset)):
+        return sorted(value)
+    raise TypeError(f"Can't encode {type(value).__name__} in a change event")
+
+
+def encode(event: dict) -> str:
+    return json.dumps(
+        event, default=_json_default, separators=(",", ":"), sort_keys=True
+    )
+
+
+class JsonlSink:
+    """Appends one JSON event per line to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def send(self, events: List[dict]):
+        data = "".join(encode(event) + "\n" for event in events).encode()
+        # One unbuffered append per batch, so shards sharing the file never split a line
+        with open(self.path, "ab", buffering=0) as f:
+            f.write(data)
+
+
+class StdoutSink:
+    def send(self, events: List[dict]):
+        sys.stdout.writelines(encode(event) + "\n" for event in events)
+        sys.stdout.flush()
+
+
+class SqsSink:
+    """Sends one message per event to an SQS queue.
+
+    client is anything with SQS's send_message_batch, e.g. a local stand-in,
+    a boto3 client is created on first use otherwise.
+    """
+
+    def __init__(self, queue_url: str, client=None):
+        self.queue_url = queue_url
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("sqs", region_name="us-west-2")
+        return self._client
+
+    def send(self, events: List[dict]):
+        for start in range(0, len(events), SQS_BATCH_SIZE):
+            entries = {
+                str(i): {"Id": str(i), "MessageBody": encode(event)}
+                for i, event in enumerate(events[start : start + SQS_BATCH_SIZE])
+            }
+            attempt = 0
+            while entries:
+                response = self.client.send_message_batch(
+                    QueueUrl=self.queue_url, Entries=list(entries.values())
+                )
+                failed = response.get("Failed") or []
+                entries = {f["Id"]: entries[f["Id"]] for f in failed}
+                attempt = _backoff(attempt, entries, f"SQS queue {self.queue_url}")
+
+
+class KinesisSink:
+    """Puts one record per event on a Kinesis stream, partitioned by table and key so the
+    events of one item land on the same shard in the order they were written.
+
+    client is anything with Kinesis's put_records, a boto3 client by default.
+    """
+
+    def __init__(self, stream_name: str, client=None):
+        self.stream_name = stream_name
+        self._client = client
+
+    @property
+    def client(self):
+        if self._client is None:
+            import boto3
+
+            self._client = boto3.client("kinesis", region_name="us-west-2")
+        return self._client
+
+    def send(self, events: List[dict]):
+        for start in range(0, len(events), KINESIS_BATCH_SIZE):
+            records = [
+                {
+                    "Data": encode(event).encode(),
+                    # Kinesis takes partition keys of up to 256 characters
+                    "PartitionKey": (event["table"] + encode(event["key"]))[:256],
+                }
+                for event in events[start : start + KINESIS_BATCH_SIZE]
+            ]
+            attempt = 0
+            while records:
+                response = self.client.put_records(
+                    StreamName=self.stream_name, Records=records
+                )
+                # Results are in the order of the records, failed ones carry an ErrorCode
+                records = [
+                    record
+                    for record, result in zip(records, response.get("Records", []))
+                    if result.get("ErrorCode")
+                ]
+                attempt = _backoff(
+                    attempt, records, f"Kinesis stream {self.stream_name}"
+                )
+
+
+def _backoff(attempt: int, pending, target: str) -> int:
+    if not pending:
+        return attempt
+    attempt += 1
+    if attempt > MAX_SEND_RETRIES:
+        raise RuntimeError(f"Gave up on {len(pending)} change events for {target}")
+    logger.debug(f"Retrying {len(pending)} change events for {target}")
+    sleep(min(0.05 * 2**attempt, 5))
+    return attempt
+
+
+class ChangeEvents:
+    """Collects change events from any thread and hands them to a sink in batches.
+
+    The table syncs flush at the end of every stage, so consumers see the changes of a
+    stage once it finished. Events are at most once: a sink that keeps failing drops its
+    batch after logging it, the items are written and the manifest would skip them.
+    """
+
+    def __init__(self, sink, max_buffered: int = MAX_BUFFERED):
+        self.sink = sink
+        self.max_buffered = max_buffered
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._buffer: List[dict] = []
+
+    def emit(self, table: str, key: dict, old: Optional[dict], new: Optional[dict]):
+        event = change_event(table, key, old, new)
+        with self._lock:
+            self._buffer.append(event)
+            full = len(self._buffer) >= self.max_buffered
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._send_lock:
+            with self._lock:
+                events, self._buffer = self._buffer, []
+            if not events:
+                return
+            try:
+                self.sink.send(events)
+            except Exception as e:
+                logger.error(f"Dropped {len(events)} change events", exc_info=e)
+                metrics.inc("change_events_dropped", len(events))
+            else:
+                metrics.inc("change_events_sent", len(events))
+
+
+def change_events_from_env(value: Optional[str]) -> Optional[ChangeEvents]:
+    """LOADER_EVENTS: where to send change events, unset sends none.
+
+    `jsonl:<path>`, `stdout`, `sqs:<queue url>` or `kinesis:<stream name>`.
+    """
+    if not value:
+        return None
+    kind, _, target = value.partition(":")
+    if kind == "stdout":
+        return ChangeEvents(StdoutSink())
+    sinks = {"jsonl": JsonlSink, "sqs": SqsSink, "kinesis": KinesisSink}
+    if kind not in sinks or not target:
+        raise ValueError(f"Unknown LOADER_EVENTS {value!r}")
+    return ChangeEvents(sinks[kind](target))
@@ -0,0 +1,69 @@
+import logging
+import subprocess
+import sys
+from time import sleep
+from typing import List
+
+from util.progress import shared_progress
+from util.shard import Shard
+from util.state import state_path
+
+logger = logging.getLogger(__name__)
+
+
+def shard_command() -> List[str]:
+    # The Docker image ships a PyInstaller binary, everywhere else run the module again
+    if getattr(sys, "frozen", False):
+        return [sys.executable]
+    return [sys.executable, "-m", "load_everything"]
+
+
+def launch_shards(count: int, args: List[str]) -> int:
+    """Runs count shards of the same command as local processes and waits for all of them.
+
+    The shards share one Leaguepedia rate budget through a lock file, each one logs to
+    its own file and writes its own metrics. Returns 1 if any shard failed.
+    """
+    rate_budget = state_path("rate-budget.json")
+    # Start from the configured rate instead of where a previous run backed off to
+    rate_budget.unlink(missing_ok=True)
+
+    shards = []
+    for index in range(count):
+        shard = Shard(index, count)
+        log_path = state_path(f"load{shard.suffix}.log")
+        with open(log_path, "w") as log:
+            process = subprocess.Popen(
+                shard_command()
+                + ["--shard", str(shard), "--rate-budget", str(rate_budget)]
+                + args,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+            )
+        logger.info(
+            f"Started shard {shard} as pid {process.pid}, logging to {log_path}"
+        )
+        shards.append((shard, process, log_path))
+
+    failed = 0
+    with shared_progress() as progress:
+        tasks = {
+            shard.index: progress.add_task(f"Shard {shard}", total=1)
+            for shard, _, _ in shards
+        }
+        running = list(shards)
+        while running:
+            for shard, process, log_path in list(running):
+                code = process.poll()
+                if code is None:
+                    continue
+                running.remove((shard, process, log_path))
+                progress.update(tasks[shard.index], completed=1)
+                if code:
+                    failed += 1
+                    logger.error(f"Shard {shard} failed with {code}, see {log_path}")
+                else:
+                    logger.info(f"Shard {shard} finished")
+            if running:
+                sleep(1)
+    return 1 if failed else 0
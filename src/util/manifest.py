@@ -0,0 +1,192 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+from decimal import Decimal
+from typing import Iterable, Optional, Tuple
+
+from util.metrics import metrics
+from util.state import state_path
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(value):
+    # DynamoDB hands numbers back as Decimal, the models hold ints and Decimals.
+    # Normalizing both sides keeps the hash of a model equal to the hash of its stored item.
+    normalize = _NORMALIZERS.get(type(value))
+    if normalize is None:
+        # Subclasses, e.g. an OrderedDict, are normalized like their base type
+        normalize = next(
+            (fn for kind, fn in _NORMALIZERS.items() if isinstance(value, kind)), str
+        )
+    return normalize(value)
+
+
+def _same(value):
+    return value
+
+
+def _number(value) -> str:
+    return str(Decimal(value).normalize())
+
+
+def _mapping(value: dict) -> dict:
+    # Most values are strings, skip the call for them
+    return {k: v if type(v) is str else _normalize(v) for k, v in value.items()}
+
+
+def _sequence(value) -> list:
+    return [_normalize(v) for v in value]
+
+
+def _set(value) -> list:
+    return sorted(_normalize(v) for v in value)
+
+
+_NORMALIZERS = {
+    str: _same,
+    bool: _same,
+    type(None): _same,
+    int: _number,
+    float: _number,
+    Decimal: _number,
+    dict: _mapping,
+    list: _sequence,
+    tuple: _sequence,
+    set: _set,
+    frozenset: _set,
+}
+
+
+def content_hash(item: dict) -> str:
+    encoded = json.dumps(_normalize(item), sort_keys=True, separators=(",", ":"))
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+
+def manifest_key(key: dict) -> str:
+    return json.dumps(_normalize(key), sort_keys=True, separators=(",", ":"))
+
+
+class Manifest:
+    """Local SQLite map of (table, key()) -> hash of the last ddb_format() written.
+
+    A row whose hash matches can be skipped without reading it back from DynamoDB.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._lock = threading.Lock()
+        # Opened on first use, importing the loaders touches no local state
+        self._connection = None
+
+    @property
+    def path(self) -> str:
+        return str(self._path or state_path("manifest.sqlite3"))
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # Only used with self._lock held
+        if self._connection is None:
+            # Shards share the file, wait for each other's writes instead of failing
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS manifest ("
+                "table_name TEXT NOT NULL, item_key TEXT NOT NULL, hash TEXT NOT NULL, "
+                "PRIMARY KEY (table_name, item_key)) WITHOUT ROWID"
+            )
+            conn.commit()
+            self._connection = conn
+        return self._connection
+
+    def get(self, table_name: str, key: dict) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT hash FROM manifest WHERE table_name = ? AND item_key = ?",
+                (table_name, manifest_key(key)),
+            ).fetchone()
+        return row[0] if row else None
+
+    def update(self, table_name: str, entries: Iterable[Tuple[dict, str]]):
+        rows = [(table_name, manifest_key(key), h) for key, h in entries]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO manifest (table_name, item_key, hash) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+
+    def remove(self, table_name: str, keys: Iterable[dict]):
+        rows = [(table_name, manifest_key(key)) for key in keys]
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM manifest WHERE table_name = ? AND item_key = ?", rows
+            )
+            self._conn.commit()
+
+    def clear(self, table_name: str):
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM manifest WHERE table_name = ?", (table_name,)
+            )
+            self._conn.commit()
+
+    def entries(self, table_name: str) -> dict:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item_key, hash FROM manifest WHERE table_name = ?",
+                (table_name,),
+            ).fetchall()
+        return dict(rows)
+
+    def verify(self, table, key_names) -> dict:
+        """Scans the table and compares it to the manifest without changing anything."""
+        known = self.entries(table.name)
+        counts = {"ok": 0, "stale": 0, "missing": 0, "orphaned": 0}
+        for item in scan_items(table):
+            key = manifest_key({name: item[name] for name in key_names})
+            expected = known.pop(key, None)
+            if expected is None:
+                counts["missing"] += 1
+            elif expected != content_hash(item):
+                counts["stale"] += 1
+            else:
+                counts["ok"] += 1
+        counts["orphaned"] = len(known)
+        logger.info(f"Manifest for {table.name}: {counts}")
+        return counts
+
+    def rebuild(self, table, key_names) -> int:
+        """Rehydrates the manifest entries of a table from a full scan."""
+        self.clear(table.name)
+        batch = []
+        total = 0
+        for item in scan_items(table):
+            batch.append(({name: item[name] for name in key_names}, content_hash(item)))
+            if len(batch) >= 1000:
+                self.update(table.name, batch)
+                total += len(batch)
+                batch = []
+        self.update(table.name, batch)
+        total += len(batch)
+        logger.info(f"Rebuilt manifest for {table.name} with {total} items")
+        return total
+
+
+def scan_items(table, **kwargs):
+    kwargs.setdefault("ReturnConsumedCapacity", "TOTAL")
+    response = table.scan(**kwargs)
+    _record_scan(table, response)
+    yield from response.get("Items", [])
+    while "LastEvaluatedKey" in response:
+        response = table.scan(ExclusiveStartKey=response["LastEvaluatedKey"], **kwargs)
+        _record_scan(table, response)
+        yield from response.get("Items", [])
+
+
+def _record_scan(table, response):
+    metrics.inc("ddb_requests", operation="Scan", table=table.name)
+    metrics.record_capacity(response, "read")
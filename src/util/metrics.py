@@ -0,0 +1,172 @@
+import functools
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter, time
+from typing import Optional
+
+from util.state import state_path
+
+logger = logging.getLogger(__name__)
+
+PREFIX = "leaguepedia_loader"
+
+# name -> help text, every counter emitted needs one
+COUNTERS = {
+    "cargo_requests": "Cargo API requests sent, including retries",
+    "cargo_pages": "Cargo pages returned",
+    "cargo_rows": "Cargo rows returned",
+    "cargo_cache_hits": "Cargo pages served from the response cache",
+    "cargo_retries": "Cargo pages retried after an error",
+    "cargo_throttled": "Ratelimit or maxlag responses from the wiki",
+    "cargo_drift": "Prefetched Cargo reads whose rows moved on the wiki mid-read",
+    "ddb_requests": "DynamoDB requests sent",
+    "ddb_consumed_read_capacity": "DynamoDB read capacity units consumed",
+    "ddb_consumed_write_capacity": "DynamoDB write capacity units consumed",
+    "items_skipped": "Items that were unchanged and not written",
+    "items_written": "Items written to DynamoDB",
+    "items_deleted": "Orphaned items deleted from DynamoDB by reconcile",
+    "change_events_sent": "Change events handed to the LOADER_EVENTS sink",
+    "change_events_dropped": "Change events lost because the sink kept failing",
+    "daemon_job_failures": "Daemon jobs that raised and were retried",
+}
+
+
+class Metrics:
+    """Run wide counters and stage timings, safe to update from any thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._stages = defaultdict(float)
+        # Per thread, the seconds spent in stages nested in each open stage
+        self._nested = threading.local()
+        self.started_at = time()
+        # File name in the state directory and labels added to every series, e.g. the shard
+        self.name = "metrics"
+        self.labels = {}
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] += value
+
+    def record_capacity(self, response: dict, operation: str):
+        """Adds the ConsumedCapacity of a response sent with ReturnConsumedCapacity=TOTAL."""
+        consumed = response.get("ConsumedCapacity") or []
+        if isinstance(consumed, dict):
+            consumed = [consumed]
+        for capacity in consumed:
+            self.inc(
+                f"ddb_consumed_{operation}_capacity",
+                capacity.get("CapacityUnits", 0),
+                table=capacity.get("TableName", ""),
+            )
+
+    @contextmanager
+    def stage(self, name: str):
+        """Records the wall time of the block as the stage's own.
+
+        Time spent in stages nested in it on the same thread, e.g. the tourneys a matches
+        run loads first, counts for those stages only, so the stage timings add up.
+        """
+        stack = self._nested.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        started = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - started
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            with self._lock:
+                self._stages[name] += elapsed - nested
+
+    def timed(self, name: str):
+        """Decorator recording the wall time of every call as a stage."""
+
+        def decorator(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def summary(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+            stages = dict(self._stages)
+        result = {
+            "labels": dict(self.labels),
+            "startedAt": self.started_at,
+            "durationSeconds": round(time() - self.started_at, 3),
+            "stageSeconds": {name: round(value, 3) for name, value in stages.items()},
+            "counters": {},
+        }
+        for (name, labels), value in sorted(counters.items()):
+            label = ",".join(f"{k}={v}" for k, v in labels)
+            result["counters"].setdefault(name, {})[label or "total"] = value
+        return result
+
+    def to_prometheus(self) -> str:
+        with self._lock:
+            counters = dict(self._counters)
+            stages = dict(self._stages)
+        run_labels = tuple(sorted(self.labels.items()))
+        lines = [
+            f"# HELP {PREFIX}_stage_seconds Wall time spent per loader stage",
+            f"# TYPE {PREFIX}_stage_seconds gauge",
+        ]
+        for name, value in sorted(stages.items()):
+            labels = _format_labels(run_labels + (("stage", name),))
+            lines.append(f"{PREFIX}_stage_seconds{labels} {value:.3f}")
+        by_name = defaultdict(list)
+        for (name, labels), value in counters.items():
+            by_name[name].append((run_labels + labels, value))
+        for name in sorted(by_name):
+            lines.append(f"# HELP {PREFIX}_{name} {COUNTERS.get(name, name)}")
+            lines.append(f"# TYPE {PREFIX}_{name} gauge")
+            for labels, value in sorted(by_name[name]):
+                lines.append(f"{PREFIX}_{name}{_format_labels(labels)} {value:g}")
+        lines.append(f"# HELP {PREFIX}_last_run_timestamp_seconds End of the last run")
+        lines.append(f"# TYPE {PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(
+            f"{PREFIX}_last_run_timestamp_seconds{_format_labels(run_labels)} {time():.0f}"
+        )
+        return "\n".join(lines) + "\n"
+
+    def write(self, json_path: Optional[str] = None, prom_path: Optional[str] = None):
+        """Writes the JSON summary and a Prometheus textfile for node_exporter."""
+        json_path = (
+            json_path
+            or os.environ.get("METRICS_JSON")
+            or state_path(f"{self.name}.json")
+        )
+        prom_path = (
+            prom_path
+            or os.environ.get("METRICS_TEXTFILE")
+            or state_path(f"{self.name}.prom")
+        )
+        with open(json_path, "w") as f:
+            json.dump(self.summary(), f, indent=2)
+        # Write then rename so the textfile collector never reads half a file
+        with open(f"{prom_path}.tmp", "w") as f:
+            f.write(self.to_prometheus())
+        os.replace(f"{prom_path}.tmp", prom_path)
+        logger.info(f"Wrote run metrics to {json_path} and {prom_path}")
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+
+metrics = Metrics()
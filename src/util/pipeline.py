@@ -0,0 +1,141 @@
+import logging
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_SIZE = 1000
+
+_END = object()
+
+
+@dataclass
+class Stage:
+    """One step of a pipeline.
+
+    fn takes one input and returns an iterable of zero or more outputs for the next stage.
+    Generators are consumed lazily, so a stage can stream e.g. cargo pages downstream.
+    flush is called once per worker after the input is exhausted, for stages holding state.
+    queue_size overrides the pipeline's size of this stage's input queue, e.g. to buffer
+    fewer items when each one is a whole page of rows.
+    """
+
+    name: str
+    fn: Callable[[Any], Iterable]
+    workers: int = 1
+    flush: Optional[Callable[[], Iterable]] = None
+    queue_size: Optional[int] = None
+
+
+def batched(size: int, name: str = "batch") -> Stage:
+    """Groups items into lists of up to size. Runs with a single worker."""
+    buffer = []
+
+    def add(item):
+        buffer.append(item)
+        if len(buffer) >= size:
+            chunk = list(buffer)
+            buffer.clear()
+            return [chunk]
+        return []
+
+    def flush():
+        return [list(buffer)] if buffer else []
+
+    return Stage(name, add, workers=1, flush=flush)
+
+
+def run_pipeline(
+    source: Iterable, stages: List[Stage], queue_size: int = DEFAULT_QUEUE_SIZE
+):
+    """Runs stages concurrently, each connected to the next by a bounded queue.
+
+    Memory stays bounded by the queue sizes and the first error stops every stage
+    and is re-raised here. Outputs of the last stage are dropped.
+    """
+    queues = [queue.Queue(maxsize=stage.queue_size or queue_size) for stage in stages]
+    stop = threading.Event()
+    errors = []
+
+    def put(q, item) -> bool:
+        while not stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(q):
+        while not stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def fail(e):
+        errors.append(e)
+        stop.set()
+
+    def feed():
+        try:
+            for item in source:
+                if not put(queues[0], item):
+                    return
+        except Exception as e:
+            fail(e)
+        finally:
+            for _ in range(stages[0].workers):
+                put(queues[0], _END)
+
+    def run_stage(index: int, stage: Stage, finished: List[int], lock):
+        out = queues[index + 1] if index + 1 < len(stages) else None
+
+        def emit(outputs):
+            for output in outputs or ():
+                if out is not None and not put(out, output):
+                    return
+
+        try:
+            while True:
+                item = get(queues[index])
+                if item is _END:
+                    break
+                emit(stage.fn(item))
+            if stage.flush and not stop.is_set():
+                emit(stage.flush())
+        except Exception as e:
+            logger.debug(f"Pipeline stage {stage.name} failed", exc_info=e)
+            fail(e)
+        finally:
+            with lock:
+                finished[0] += 1
+                last = finished[0] == stage.workers
+            # The last worker of a stage tells every worker of the next one to finish
+            if last and out is not None:
+                for _ in range(stages[index + 1].workers):
+                    put(out, _END)
+
+    threads = [threading.Thread(target=feed, name="pipeline-source", daemon=True)]
+    for index, stage in enumerate(stages):
+        finished = [0]
+        lock = threading.Lock()
+        threads.extend(
+            threading.Thread(
+                target=run_stage,
+                args=(index, stage, finished, lock),
+                name=f"pipeline-{stage.name}-{worker}",
+                daemon=True,
+            )
+            for worker in range(stage.workers)
+        )
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
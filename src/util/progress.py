@@ -0,0 +1,29 @@
+import threading
+from contextlib import contextmanager
+
+from rich.progress import Progress
+
+# rich allows one live display at a time, so loaders running side by side share one
+_progress = None
+_users = 0
+_lock = threading.Lock()
+
+
+@contextmanager
+def shared_progress():
+    """Yields the process wide Progress, started by the first user and stopped by the last."""
+    global _progress, _users
+    with _lock:
+        if _progress is None:
+            _progress = Progress(transient=True)
+            _progress.start()
+        _users += 1
+        progress = _progress
+    try:
+        yield progress
+    finally:
+        with _lock:
+            _users -= 1
+            if _users == 0:
+                _progress.stop()
+                _progress = None
@@ -0,0 +1,159 @@
+import gzip
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from contextlib import ExitStack
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from rich.progress import Progress
+
+from util.ddb_sync import SyncResult
+from util.manifest import manifest_key
+from util.pipeline import DEFAULT_QUEUE_SIZE, Stage, run_pipeline
+from util.progress import shared_progress
+
+logger = logging.getLogger(__name__)
+
+# ImportTable reads any number of files, keep each one comfortably small to upload
+DEFAULT_SHARD_BYTES = 256 * 1024 * 1024
+
+
+class ImportFileSync:
+    """Writes model objects to gzip DynamoDB JSON files for DynamoDB ImportTable.
+
+    Drop-in for TableSync.sync_stream, nothing is read from or written to DynamoDB.
+    Items land in `<directory>/<table>/data/<prefix>-NNNNN.json.gz`, one `{"Item": ...}` per line,
+    and a new part is started every shard_bytes of uncompressed JSON. Items are deduplicated
+    by key() like TableSync does, the last one seen wins: close() rewrites the parts holding
+    an item that a later one replaced. Every exported key is kept in memory until then,
+    a few hundred bytes per item.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        table_name: str,
+        shard_bytes: int = DEFAULT_SHARD_BYTES,
+        prefix: str = "part",
+    ):
+        self.root = directory
+        self.directory = os.path.join(directory, table_name, "data")
+        self.table_name = table_name
+        # Taken from the first model's key(), the export never talks to DynamoDB
+        self.key_names = None
+        self.shard_bytes = shard_bytes
+        self.prefix = prefix
+        self.files = []
+        self.items = 0
+        self.duplicates = 0
+        # Part and line of the last item written per key, and the lines later ones replaced
+        self._latest: Dict[str, Tuple[int, int]] = {}
+        self._replaced: Dict[int, Set[int]] = defaultdict(set)
+        # boto3 is heavy to import and only needed once a backfill runs
+        from boto3.dynamodb.types import TypeSerializer
+
+        self._serializer = TypeSerializer()
+        self._lock = threading.Lock()
+        self._file = None
+        self._file_bytes = 0
+        self._file_lines = 0
+
+    def sync_stream(
+        self,
+        source: Iterable,
+        stages: List[Stage],
+        progress: Optional[Progress] = None,
+        description: Optional[str] = None,
+        write_workers: int = 1,
+        on_write: Optional[Callable] = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ) -> SyncResult:
+        """Same contract as TableSync.sync_stream, on_write gets None as the old item."""
+        result = SyncResult()
+        with ExitStack() as stack:
+            if progress is None:
+                progress = stack.enter_context(shared_progress())
+            task = progress.add_task(
+                description or f"Exporting {self.table_name}", total=None
+            )
+
+            # A single writer keeps the file order deterministic for a given source
+            def write(item):
+                self.write(item)
+                result.written += 1
+                if on_write:
+                    on_write(item, None)
+                progress.advance(task)
+                return ()
+
+            try:
+                run_pipeline(
+                    source, stages + [Stage("export", write)], queue_size=queue_size
+                )
+            finally:
+                progress.stop_task(task)
+                progress.update(task, visible=False)
+        logger.info(f"Exported {self.table_name}: {result}")
+        return result
+
+    def write(self, item):
+        """Appends one model, replacing an item with the same key exported before."""
+        key = manifest_key(item.key())
+        image = {k: self._serializer.serialize(v) for k, v in item.ddb_format().items()}
+        line = json.dumps({"Item": image}, separators=(",", ":")).encode() + b"\n"
+        with self._lock:
+            if self.key_names is None:
+                self.key_names = list(item.key())
+            if self._file is None or self._file_bytes >= self.shard_bytes:
+                self._open_next()
+            previous = self._latest.get(key)
+            if previous is None:
+                self.items += 1
+            else:
+                part, number = previous
+                self._replaced[part].add(number)
+                self.duplicates += 1
+            self._latest[key] = (len(self.files) - 1, self._file_lines)
+            self._file.write(line)
+            self._file_bytes += len(line)
+            self._file_lines += 1
+
+    def _open_next(self):
+        if self._file is not None:
+            self._file.close()
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(
+            self.directory, f"{self.prefix}-{len(self.files):05d}.json.gz"
+        )
+        self._file = gzip.open(path, "wb")
+        self._file_bytes = 0
+        self._file_lines = 0
+        self.files.append(path)
+
+    def _drop_replaced(self):
+        for part, numbers in sorted(self._replaced.items()):
+            path = self.files[part]
+            with gzip.open(path, "rb") as src, gzip.open(f"{path}.tmp", "wb") as dst:
+                for number, line in enumerate(src):
+                    if number not in numbers:
+                        dst.write(line)
+            os.replace(f"{path}.tmp", path)
+        self._replaced.clear()
+
+    def close(self) -> dict:
+        """Finishes the open part and returns this table's entry of the backfill manifest."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._drop_replaced()
+        return {
+            "items": self.items,
+            "duplicatesDropped": self.duplicates,
+            "keySchema": self.key_names,
+            "inputFormat": "DYNAMODB_JSON",
+            "inputCompressionType": "GZIP",
+            "files": [os.path.relpath(path, self.root) for path in self.files],
+        }
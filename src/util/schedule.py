@@ -0,0 +1,50 @@
+import datetime
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from util.datetime import parse_datetime_utc
+
+
+class MatchCalendar:
+    """Start times of the matches around now and whether they are decided yet.
+
+    Fed with the MatchSchedule rows the daemon loads, it tells how soon matches need
+    polling again: right away while one is played or about to start, otherwise once
+    the next one is about to start.
+    """
+
+    def __init__(
+        self,
+        lead: datetime.timedelta = datetime.timedelta(hours=1),
+        live_for: datetime.timedelta = datetime.timedelta(hours=5),
+    ):
+        # Matches are watched from lead before their start until they have a winner,
+        # or for at most live_for after the start when the result never shows up
+        self.lead = lead
+        self.live_for = live_for
+        self._lock = threading.Lock()
+        self._matches: Dict[str, Tuple[datetime.datetime, bool]] = {}
+
+    def observe(self, rows: Iterable[dict]):
+        with self._lock:
+            for row in rows:
+                start = parse_datetime_utc(row["DateTime UTC"])
+                if start is not None:
+                    self._matches[row["MatchId"]] = start, bool(row["Winner"])
+
+    def until_next(self, now: datetime.datetime) -> Optional[datetime.timedelta]:
+        """Time until a match needs watching, zero while one does and None if none will.
+
+        now is a naive UTC datetime like the cargo dates.
+        """
+        waits = []
+        with self._lock:
+            for match_id, (start, decided) in list(self._matches.items()):
+                if start + self.live_for < now:
+                    del self._matches[match_id]
+                elif not decided:
+                    waits.append(max(start - self.lead - now, datetime.timedelta(0)))
+        return min(waits, default=None)
+
+    def __len__(self):
+        return len(self._matches)
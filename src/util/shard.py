@@ -0,0 +1,41 @@
+import hashlib
+
+
+def stable_bucket(value, count: int) -> int:
+    """Bucket of a value that is the same in every process, unlike hash() of a str."""
+    digest = hashlib.blake2b(str(value).encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % count
+
+
+class Shard:
+    """One of count hash partitions of the leagues, `0/4` is the first of four.
+
+    Every process or container started with the same count and a different index loads
+    a disjoint part, together they cover everything. Tournaments, matches and games
+    belong to the shard of their league.
+    """
+
+    def __init__(self, index: int, count: int):
+        if count < 1 or not 0 <= index < count:
+            raise ValueError(f"Shard index must be in [0, {count}), got {index}")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, spec: str) -> "Shard":
+        try:
+            index, count = (int(part) for part in spec.split("/"))
+        except ValueError:
+            raise ValueError(f"Shard must look like i/N, got {spec!r}")
+        return cls(index, count)
+
+    def owns(self, value) -> bool:
+        return self.count == 1 or stable_bucket(value, self.count) == self.index
+
+    @property
+    def suffix(self) -> str:
+        """Appended to local state file names so shards never share a file."""
+        return f"-shard-{self.index}-of-{self.count}"
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
@@ -0,0 +1,17 @@
+import os
+from pathlib import Path
+
+
+def state_dir() -> Path:
+    """Directory for local loader state, override with LOADER_STATE_DIR."""
+    path = Path(
+        os.environ.get(
+            "LOADER_STATE_DIR", Path.home() / ".cache" / "leaguepedia-loader"
+        )
+    )
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def state_path(name: str) -> Path:
+    return state_dir() / name
@@ -1,47 +1,141 @@
-from logging import Logger
+import json
+import logging
+import os
+import threading
+from collections import Counter
+from time import time
+from typing import Dict, Iterable, Optional
 
 from leaguepedia.leaguepedia import leaguepedia
+from models.team import swap_problematic_team_ids
+from util.state import state_path
 
-team_code_dict = {}
+logger = logging.getLogger(__name__)
 
-logger = Logger(__name__)
+# Names used in MatchSchedule/Players that don't resolve through Teams or TeamRedirects
+team_name_overrides = {
+    "Rogue (European Team)": "RGE",
+    "Evil Geniuses.NA": "EG",
+    "PEACE (Oceanic Team)": "PCE",
+    "RED Kalunga": "RED",
+    "Team Infernal Drake": "TID",
+    "DAMWON Gaming": "DK",
+    "Istanbul Wildcats": "IW",
+    "Afreeca Freecs": "KDF",
+    "eStar (Chinese Team)": "UP",
+    "Vorax Academy": "LBR.A",
+    "Mousesports": "MOUZ",
+}
 
+# Placeholders that are expected to stay unresolved
+unresolvable_names = {"", "TBD"}
 
-def get_team_code_from_name(team_name: str) -> str:
-    if team_code_dict == {}:
-        logger.debug("Loading Team Codes into Cache...")
-        res = leaguepedia.query(
-            tables="Teams",
-            fields="Name, Short",
-        )
-        for team in res:
-            team_code_dict[team["Name"]] = team
-        logger.debug(f"Added {len(res)} team codes to the cache")
-    try:
-        if "Rogue (European Team)" == team_name:
-            return "RGE"
-        elif "Evil Geniuses.NA" == team_name:
-            return "EG"
-        elif "PEACE (Oceanic Team)" == team_name:
-            return "PCE"
-        elif "RED Kalunga" == team_name:
-            return "RED"
-        elif "Team Infernal Drake" == team_name:
-            return "TID"
-        elif "DAMWON Gaming" == team_name:
-            return "DK"
-        elif "Istanbul Wildcats" == team_name:
-            return "IW"
-        elif "Afreeca Freecs" == team_name:
-            return "KDF"
-        elif "eStar (Chinese Team)" == team_name:
-            return "UP"
-        elif "Vorax Academy" == team_name:
-            return "LBR.A"
-        elif "Mousesports" == team_name:
-            return "MOUZ"
-        else:
-            return team_code_dict[team_name]["Short"]
-    except KeyError:
-        logger.debug(f"Could not find short for {team_name}")
+# Rebuild the persisted index once it is older than this, 0 rebuilds it on every run
+INDEX_MAX_AGE_SECONDS = int(os.environ.get("TEAM_INDEX_MAX_AGE", 24 * 60 * 60))
+
+
+class TeamResolver:
+    """Resolves team names to the teamId we store, using a compact name -> code index.
+
+    The index is built once from Teams and TeamRedirects with the manual overrides merged
+    on top and is persisted between runs. Names that don't resolve are counted.
+    """
+
+    def __init__(self, site=leaguepedia, path: Optional[str] = None):
+        self.site = site
+        self.path = path or state_path("team_index.json")
+        self._index: Optional[Dict[str, str]] = None
+        self._lower_index: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.unresolved = Counter()
+
+    @property
+    def index(self) -> Dict[str, str]:
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._set_index(self._load() or self._build())
+        return self._index
+
+    def _set_index(self, index: Dict[str, str]):
+        self._lower_index = {name.lower(): code for name, code in index.items()}
+        self._index = index
+
+    def _load(self) -> Optional[Dict[str, str]]:
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+        if time() - saved.get("builtAt", 0) > INDEX_MAX_AGE_SECONDS:
+            return None
+        logger.debug(f"Loaded {len(saved['index'])} team codes from {self.path}")
+        return saved["index"]
+
+    def _build(self, teams: Optional[Iterable[dict]] = None) -> Dict[str, str]:
+        logger.debug("Building team code index...")
+        if teams is None:
+            teams = self.site.query_iter(tables="Teams", fields="Name, Short")
+        index = {}
+        for team in teams:
+            # The swap renames in place and the rows may be shared with the Teams loader
+            team = {"Name": team["Name"], "Short": team["Short"]}
+            name = team["Name"]
+            # Same ids as the Teams table, the swap may also rename the team, both names resolve
+            index[name] = index[team["Name"]] = swap_problematic_team_ids(team)
+
+        lower = {name.lower(): code for name, code in index.items()}
+        for redirect in self.site.query_iter(
+            tables="TeamRedirects", fields="AllName, OtherName"
+        ):
+            code = lower.get(str(redirect["AllName"]).lower())
+            if code is not None and redirect["OtherName"]:
+                index.setdefault(redirect["OtherName"], code)
+
+        index.update(team_name_overrides)
+        logger.debug(f"Built team code index with {len(index)} names")
+        self.save(index)
+        return index
+
+    def save(self, index: Dict[str, str]):
+        # Shards may rebuild the index at the same time, never let one read half a file
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"builtAt": time(), "index": index}, f)
+        os.replace(tmp, self.path)
+
+    def rebuild(self, teams: Optional[Iterable[dict]] = None) -> Dict[str, str]:
+        """Builds a fresh index, from already fetched Teams rows if given."""
+        with self._lock:
+            self._set_index(self._build(teams))
+        return self._index
+
+    def resolve(self, team_name: str) -> str:
+        index = self.index
+        code = index.get(team_name)
+        if code is None:
+            code = self._lower_index.get(str(team_name).lower())
+        if code is not None:
+            return code
+        if team_name not in unresolvable_names and team_name is not None:
+            with self._lock:
+                self.unresolved[team_name] += 1
         return team_name
+
+    def report_unresolved(self, top: int = 20):
+        with self._lock:
+            unresolved = self.unresolved.most_common()
+            self.unresolved.clear()
+        if not unresolved:
+            return
+        logger.warning(
+            f"Could not resolve {len(unresolved)} team names "
+            f"({sum(count for _, count in unresolved)} rows), most common: {unresolved[:top]}"
+        )
+
+
+team_resolver = TeamResolver()
+
+
+def get_team_code_from_name(team_name: str) -> str:
+    return team_resolver.resolve(team_name)
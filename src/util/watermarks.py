@@ -0,0 +1,85 @@
+import json
+import logging
+import threading
+from typing import Iterable, Iterator, Optional
+
+from util.state import state_path
+
+logger = logging.getLogger(__name__)
+
+# Field every incremental query selects from the joined _pageData table
+MODIFICATION_DATE = "ModificationDate"
+
+
+class Watermarks:
+    """High-water marks of `_modificationDate` per cargo table, kept in a local JSON file."""
+
+    def __init__(self, path: Optional[str] = None):
+        self._path = path
+        self._lock = threading.Lock()
+        # Read on first use, importing the loaders touches no local state
+        self._loaded: Optional[dict] = None
+
+    @property
+    def path(self) -> str:
+        return str(self._path or state_path("watermarks.json"))
+
+    @property
+    def _marks(self) -> dict:
+        # Only used with self._lock held
+        if self._loaded is None:
+            try:
+                with open(self.path) as f:
+                    self._loaded = json.load(f)
+            except FileNotFoundError:
+                self._loaded = {}
+        return self._loaded
+
+    def get(self, table: str) -> Optional[str]:
+        with self._lock:
+            return self._marks.get(table)
+
+    def tracker(self, table: str) -> "WatermarkTracker":
+        return WatermarkTracker(self, table)
+
+    def set_if_newer(self, table: str, newest: Optional[str]):
+        if newest is None:
+            return
+        with self._lock:
+            current = self._marks.get(table)
+            # Cargo dates are "YYYY-MM-DD HH:MM:SS" so they compare as strings
+            if current is None or newest > current:
+                self._marks[table] = newest
+                self._save()
+        logger.info(f"Watermark for {table} is now {self.get(table)}")
+
+    def reset(self, table: Optional[str] = None):
+        with self._lock:
+            if table is None:
+                self._loaded = {}
+            else:
+                self._marks.pop(table, None)
+            self._save()
+
+    def _save(self):
+        with open(self.path, "w") as f:
+            json.dump(self._marks, f, indent=2, sort_keys=True)
+
+
+class WatermarkTracker:
+    """Remembers the newest modification date of streamed rows until commit()."""
+
+    def __init__(self, watermarks: Watermarks, table: str):
+        self.watermarks = watermarks
+        self.table = table
+        self.newest = None
+
+    def observe(self, rows: Iterable[dict]) -> Iterator[dict]:
+        for row in rows:
+            modified = row.get(MODIFICATION_DATE)
+            if modified and (self.newest is None or modified > self.newest):
+                self.newest = modified
+            yield row
+
+    def commit(self):
+        self.watermarks.set_if_newer(self.table, self.newest)